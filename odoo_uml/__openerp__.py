@@ -9,7 +9,11 @@
     'version': '11.0.1.0.0',
     'depends': ['base'],
     'data': [
-        'views/inherited_module_views.xml'
+        'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
+        'wizard/puml_options_wizard_views.xml',
+        'views/inherited_module_views.xml',
+        'wizard/puml_export_wizard_views.xml'
     ]
 }
 
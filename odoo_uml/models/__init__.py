@@ -1,2 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import inherited_module
+from . import puml_diagram
+from . import puml_render_queue
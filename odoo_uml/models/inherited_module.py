@@ -1,12 +1,18 @@
-
 ###############################################################################
 #    License, author and contributors information in:                         #
 #    __manifest__.py file at the root folder of this module.                  #
 ###############################################################################
 
+import json
+import hashlib
 import logging
+from base64 import b64decode, b64encode
+
+import psycopg2
 
 from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import config
 
 try:
     from odoo.addons.odoo_uml.utils.plant_uml import PlantUMLClassDiagram, bold, italic
@@ -14,12 +20,44 @@ except ImportError:
     from ..utils.plant_uml import PlantUMLClassDiagram, bold, italic
 
 try:
-    from odoo.addons.odoo_uml.utils.odoo_uml import PackageDiagram, InvPackageDiagram, ClassDiagram
+    from odoo.addons.odoo_uml.utils.odoo_uml import PackageDiagram, InvPackageDiagram, ClassDiagram, render_timeout
+except ImportError:
+    from ..utils.odoo_uml import PackageDiagram, InvPackageDiagram, ClassDiagram, render_timeout
+
+try:
+    from odoo.addons.odoo_uml.utils.invalidation import changed_modules, is_stale
 except ImportError:
-    from ..utils.odoo_uml import PackageDiagram, InvPackageDiagram, ClassDiagram
+    from ..utils.invalidation import changed_modules, is_stale
 
 _logger = logging.getLogger(__name__)
 
+#: Attachment name for a stored diagram, formatted with signature, diagram kind and extension.
+PUML_ATTACHMENT_NAME = 'odoo_uml.{0}.{1}.{2}'
+#: Signature of diagrams invalidated by an upgrade, still shown until rendered again.
+PUML_STALE_SIGNATURE = 'stale'
+#: Diagram kinds with their diagram class.
+PUML_DIAGRAMS = {
+    'dependency': PackageDiagram,
+    'inv_dependency': InvPackageDiagram,
+    'class': ClassDiagram,
+}
+PUML_DIAGRAM_KINDS = ['dependency', 'inv_dependency', 'class']
+#: Maximum number of diagrams rendered by a background rendering run.
+PUML_RENDER_BATCH = 20
+#: Fields diagrams depend on.
+PUML_DEPENDS = [
+    'puml_internal_struct',
+    'puml_package_human_name',
+    'puml_dependency_depth',
+    'puml_inv_dependency_depth',
+    'name',
+    'latest_version',
+    'state',
+    'dependencies_id',
+    'dependencies_id.depend_id',
+    'dependencies_id.depend_id.name'
+]
+
 
 class Module(models.Model):
     _inherit = 'ir.module.module'
@@ -31,25 +69,25 @@ class Module(models.Model):
     # Direct Dependency
     puml_dependency_diagram = fields.Text(
         u'Dependency diagram',
-        compute='_compute_diagrams'
+        compute='_compute_dependency_diagram'
     )
 
     puml_dependency_diagram_png = fields.Binary(
         string=u'Dependency Diagram Image',
         help='Dependency diagram as encode base64 PNG image.',
-        compute='_compute_diagrams'
+        compute='_compute_dependency_diagram'
     )
 
     # Inverse Dependency
     puml_inv_dependency_diagram = fields.Text(
         u'Inverse Dependency diagram',
-        compute='_compute_diagrams'
+        compute='_compute_inv_dependency_diagram'
     )
 
     puml_inv_dependency_diagram_png = fields.Binary(
         string=u'Inverse Dependency Diagram Image',
         help='Dependency diagram as encode base64 PNG image.',
-        compute='_compute_diagrams'
+        compute='_compute_inv_dependency_diagram'
     )
 
     # *************************************************************************
@@ -59,23 +97,23 @@ class Module(models.Model):
     # Class Diagram
     puml_class_diagram = fields.Text(
         u'Class diagram',
-        compute='_compute_diagrams'
+        compute='_compute_class_diagram'
     )
 
     puml_class_diagram_png = fields.Binary(
         string=u'Class Diagram Image',
         help='Class diagram as encode base64 PNG image.',
-        compute='_compute_diagrams'
+        compute='_compute_class_diagram'
     )
     puml_class_diagram_uml = fields.Text(
         string="Class Diagram Text",
         help='Class diagram as text.',
-        compute='_compute_diagrams'
+        compute='_compute_class_diagram'
     )
 
     puml_diagram_log = fields.Text(
         u'Dependency diagram log',
-        compute='_compute_diagrams'
+        compute='_compute_diagram_log'
     )
 
     puml_package_human_name = fields.Boolean(
@@ -90,55 +128,453 @@ class Module(models.Model):
         default=False
     )
 
-    @api.depends(
-        'puml_internal_struct',
-        'puml_package_human_name',
-        'name',
-        'dependencies_id',
-        'dependencies_id.depend_id',
-        'dependencies_id.depend_id.name'
+    puml_dependency_depth = fields.Integer(
+        string=u'Dependency diagram depth',
+        help='Draw dependencies up to this number of hops, farther ones are '
+             'collapsed. 0 draws all of them.',
+        default=0
+    )
+
+    puml_inv_dependency_depth = fields.Integer(
+        string=u'Inverse dependency diagram depth',
+        help='Draw modules depending on this one up to this number of hops, '
+             'farther ones are collapsed. 0 draws all of them.',
+        default=0
     )
-    def _compute_diagrams(self):
+
+    puml_render_state = fields.Selection(
+        [
+            ('queued', 'Queued'),
+            ('rendering', 'Rendering'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        string=u'Diagram render state',
+        help='State of background diagram rendering, last rendered diagrams are '
+             'shown until new ones are ready.',
+        compute='_compute_render_state'
+    )
+
+    @api.constrains('puml_dependency_depth', 'puml_inv_dependency_depth')
+    def _check_puml_depth(self):
+        for module in self:
+            if module.puml_dependency_depth < 0 or module.puml_inv_dependency_depth < 0:
+                raise ValidationError(_('Diagram depths can not be negative, 0 draws every module.'))
+
+    def _puml_signature(self):
+        ''' Hash of everything stored diagrams depend on: module version, state,
+            dependency set and diagram options.
+
+            :rtype: str
+        '''
+        self.ensure_one()
+        return hashlib.sha1(repr((
+            self.name,
+            self.latest_version,
+            self.state,
+            sorted(self.dependencies_id.mapped('name')),
+            self.puml_internal_struct,
+            self.puml_package_human_name,
+            self.puml_dependency_depth,
+            self.puml_inv_dependency_depth,
+        )).encode('utf-8')).hexdigest()
+
+    def _puml_attachments(self, kind='%'):
+        self.ensure_one()
+        return self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('name', '=like', PUML_ATTACHMENT_NAME.format('%', kind, '%')),
+        ])
+
+    def _puml_read_attachments(self, kind, signature=None):
+        ''' Return stored diagram for signature, or None if it is missing.
+
+            :param str signature: signature of diagram, last stored one if None.
+            :return: dict with "puml", "png", "log" and "dot" (Graphviz source
+                of diagrams rendered with Graphviz, else None) keys.
+            :rtype: dict
+        '''
+        attachments = self._puml_attachments(kind)
+        if signature is None:
+            if not attachments:
+                return None
+            signature = attachments[0].name.split('.')[1]
+        stored = {att.name: att for att in attachments}
+        values = {'dot': None}
+        for ext in ['puml', 'png', 'log', 'dot']:
+            att = stored.get(PUML_ATTACHMENT_NAME.format(signature, kind, ext))
+            if att is None:
+                if ext == 'dot':
+                    continue
+                return None
+            if ext == 'png':
+                values[ext] = att.datas
+            else:
+                values[ext] = b64decode(att.datas or b'').decode('utf-8')
+        return values
+
+    def _puml_write_attachments(self, kind, signature, values):
+        ''' Replace stored diagram of kind with values produced for signature. The
+            modules the diagram was read from ("closure" value) are kept in
+            ``puml.diagram``, see :py:meth:`_puml_invalidate`.
+        '''
+        self._puml_attachments(kind).unlink()
+        Attachment = self.env['ir.attachment'].sudo()
+        for ext in ['puml', 'png', 'log', 'dot']:
+            value = values.get(ext)
+            if ext == 'dot' and not value:
+                continue
+            if ext == 'png':
+                datas, mimetype = value, 'image/png'
+            else:
+                datas, mimetype = b64encode((value or '').encode('utf-8')), 'text/plain'
+            Attachment.create({
+                'name': PUML_ATTACHMENT_NAME.format(signature, kind, ext),
+                'datas_fname': '{0}.{1}'.format(kind, ext),
+                'datas': datas,
+                'mimetype': mimetype,
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+        self.env['puml.diagram'].sudo()._puml_set_closure(self, kind, values.get('closure'))
+
+    def _puml_diagram(self, kind):
+        ''' Build diagram of kind for the module.
+
+            :param str kind: one of :py:data:`PUML_DIAGRAM_KINDS`.
+            :rtype: ClassDiagram
+        '''
+        self.ensure_one()
         footer = _(
             '\n\n\n'
             ' \t\t//     Powered by **Odoo UML** with **PlantUML** technology// .'
             ' //Author//: Armando Robert Lobo <mailto:arobertlobo5@gmail.com> '
         )
+        header = _('\n\n| **Module**: | {0} |\n| **Description**: | {1} |\n| **Author**: | {2} |\n').format(
+            self.name,
+            self.summary,
+            self.author
+        )
+        titles = {
+            'dependency': _('Module Dependency Diagram'),
+            'inv_dependency': _('Module Inverse Dependency Diagram'),
+            'class': _('Models Class Diagram'),
+        }
+        depths = {
+            'dependency': self.puml_dependency_depth,
+            'inv_dependency': self.puml_inv_dependency_depth,
+        }
+        return PUML_DIAGRAMS[kind](
+            self,
+            title=titles[kind],
+            header=header,
+            footer=footer,
+            show_internal=self.puml_internal_struct,
+            show_descriptive_name=self.puml_package_human_name,
+            max_depth=depths.get(kind, 0),
+            env=self.env
+        )
+
+    def _puml_render(self, kinds, processes=1):
+        ''' Return diagrams of kinds of several modules. Stored diagrams are
+            reused when signature did not change, missing ones are generated,
+            rendered in a single renderer call and stored.
+
+            :param list kinds: diagram kinds.
+            :param int processes: number of diagrams rendered concurrently.
+            :return: dict by module id of dicts by kind with "puml", "png" and
+                "log" keys.
+            :rtype: dict
+        '''
+        result, missing = {}, []
         for module in self:
-            header = _('\n\n| **Module**: | {0} |\n| **Description**: | {1} |\n| **Author**: | {2} |\n').format(
-                module.name,
-                module.summary,
-                module.author
-            )
-            kwargs = {
-                'show_internal': module.puml_internal_struct,
-                'show_descriptive_name': module.puml_package_human_name,
-                'env': self.env
-            }
-            diagram = PackageDiagram(
-                self,
-                title=_('Module Dependency Diagram'),
-                header=header,
-                footer=footer,
-                **kwargs
-            )
-            module.puml_dependency_diagram_png = diagram.to_png_base64()
-
-            diagram = InvPackageDiagram(
-                self,
-                title=_('Module Inverse Dependency Diagram'),
-                header=header,
-                footer=footer,
-                **kwargs
-            )
-            module.puml_inv_dependency_diagram_png = diagram.to_png_base64()
-
-            diagram = ClassDiagram(
-                self,
-                title=_('Models Class Diagram'),
-                header=header,
-                footer=footer,
-                **kwargs
+            signature = module._puml_signature()
+            result[module.id] = {}
+            for kind in kinds:
+                result[module.id][kind] = module._puml_read_attachments(kind, signature)
+                if result[module.id][kind] is None:
+                    missing.append((module, kind, signature))
+        if missing:
+            diagrams = [module._puml_diagram(kind) for module, kind, _signature in missing]
+            images = ClassDiagram.render_png_base64(diagrams, processes=processes)
+            for (module, kind, signature), diagram, image in zip(missing, diagrams, images):
+                values = {
+                    'puml': diagram.uml,
+                    'dot': diagram.dot,
+                    'png': image,
+                    'log': diagram.log,
+                    'closure': diagram.closure(),
+                }
+                module._puml_write_attachments(kind, signature, values)
+                result[module.id][kind] = values
+        return result
+
+    def _puml_render_async(self):
+        ''' Diagrams are rendered in background unless "puml_render_sync" is in
+            context or ``odoo_uml.render_async`` parameter is "0".
+
+            :rtype: bool
+        '''
+        if self.env.context.get('puml_render_sync'):
+            return False
+        return self.env['ir.config_parameter'].sudo().get_param('odoo_uml.render_async', '1') != '0'
+
+    def _puml_enqueue(self, kinds, force=False):
+        ''' Queue diagram kinds for background rendering by
+            :py:meth:`_cron_puml_render`. Module records are never written:
+            entries live in ``puml.render.queue`` and are only written when
+            their state has to change. Diagrams being rendered or failed for
+            current signature are left alone unless force is set.
+
+            :param list kinds: diagram kinds.
+            :param bool force: queue failed diagrams of current signature too.
+        '''
+        Queue = self.env['puml.render.queue'].sudo()
+        for module in self:
+            signature = module._puml_signature()
+            entries = {entry.kind: entry for entry in Queue.search([('module_id', '=', module.id)])}
+            for kind in kinds:
+                entry = entries.get(kind)
+                if entry is not None and (
+                        entry.state == 'queued' or (entry.signature == signature and not force)):
+                    continue
+                try:
+                    with self.env.cr.savepoint():
+                        if entry is None:
+                            Queue.create({'module_id': module.id, 'kind': kind, 'signature': signature})
+                        else:
+                            entry.write({'state': 'queued', 'signature': signature, 'retried': False})
+                except psycopg2.Error:
+                    # Queued meanwhile by a concurrent request.
+                    Queue.invalidate_cache()
+
+    def _puml_get_diagrams(self, kinds):
+        ''' Return diagrams of kinds from attachments when signature did not
+            change. Otherwise they are produced and stored again, or queued for
+            background rendering and the last stored ones returned meanwhile.
+
+            :return: dict by kind with "puml", "png" and "log" keys.
+            :rtype: dict
+        '''
+        if not self._puml_render_async():
+            return self._puml_render(kinds)[self.id]
+        signature = self._puml_signature()
+        result, missing = {}, []
+        for kind in kinds:
+            result[kind] = self._puml_read_attachments(kind, signature)
+            if result[kind] is None:
+                missing.append(kind)
+        if missing:
+            self._puml_enqueue(missing)
+            for kind in missing:
+                result[kind] = self._puml_read_attachments(kind) or {'puml': False, 'png': False, 'log': False}
+        return result
+
+    @api.model
+    def _puml_mark_stale(self, attachments):
+        ''' Rename stored diagram attachments with the stale signature, they are
+            still shown until diagrams are rendered again but never match a
+            module signature.
+        '''
+        for att in attachments:
+            _prefix, _signature, kind, ext = att.name.split('.')
+            att.write({'name': PUML_ATTACHMENT_NAME.format(PUML_STALE_SIGNATURE, kind, ext)})
+
+    @api.model
+    def _puml_module_versions(self):
+        ''' Return state, version and last write of every module. The loader
+            writes modules on each install or upgrade, so an upgrade without
+            version bump is detected too.
+
+            :rtype: dict
+        '''
+        self.env.cr.execute("SELECT name, state, latest_version, write_date::text FROM ir_module_module")
+        return {name: [state, version, write_date] for name, state, version, write_date in self.env.cr.fetchall()}
+
+    @api.model
+    def _puml_invalidate(self, changed):
+        ''' Mark as stale stored diagrams read from changed modules and queue them
+            for rendering. Inverse dependency diagrams are also stale when a
+            changed module depends on one of their modules.
+
+            :param set changed: names of installed, upgraded or removed modules.
+        '''
+        depends = self.env['ir.module.module.dependency'].sudo().search_read(
+            [('module_id.name', 'in', list(changed))], ['name']
+        )
+        touched = changed | set(row['name'] for row in depends)
+        closures = {
+            (diagram.module_id.id, diagram.kind): diagram._puml_closure()
+            for diagram in self.env['puml.diagram'].sudo().search([])
+        }
+        stale = {}
+        for att in self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('name', '=like', PUML_ATTACHMENT_NAME.format('%', '%', '%')),
+        ]):
+            _prefix, signature, kind, _ext = att.name.split('.')
+            if signature == PUML_STALE_SIGNATURE:
+                continue
+            if is_stale(kind, closures.get((att.res_id, kind)), changed, touched):
+                stale.setdefault((att.res_id, kind), self.env['ir.attachment'].sudo())
+                stale[(att.res_id, kind)] |= att
+        for (res_id, kind), attachments in stale.items():
+            self._puml_mark_stale(attachments)
+            self.browse(res_id).exists()._puml_enqueue([kind])
+        if stale:
+            _logger.info('%s stored diagrams invalidated by changes of modules: %s.',
+                         len(stale), ', '.join(sorted(changed)))
+
+    @api.model_cr
+    def _register_hook(self):
+        ''' Invalidate diagrams of modules installed, upgraded or removed since
+            last start, module versions are kept in ``odoo_uml.module_versions``
+            parameter.
+        '''
+        super(Module, self)._register_hook()
+        try:
+            with self.env.cr.savepoint():
+                params = self.env['ir.config_parameter'].sudo()
+                versions = self._puml_module_versions()
+                previous = json.loads(params.get_param('odoo_uml.module_versions') or 'null')
+                if previous is not None:
+                    changed = changed_modules(previous, versions)
+                    if changed:
+                        self._puml_invalidate(changed)
+                params.set_param('odoo_uml.module_versions', json.dumps(versions, sort_keys=True))
+        except Exception:
+            _logger.exception('Unable to invalidate diagrams of upgraded modules.')
+
+    @api.model
+    def _puml_render_deadline(self):
+        ''' Seconds after which a module rendered by :py:meth:`_cron_puml_render`
+            is no longer being rendered: every diagram kind up to its render
+            timeout, or the worker time limit of cron jobs when it is longer.
+
+            :rtype: float
+        '''
+        limit = config.get('limit_time_real_cron') or 0
+        if limit <= 0:
+            limit = config.get('limit_time_real') or 0
+        return max(render_timeout(self.env) * len(PUML_DIAGRAM_KINDS), limit)
+
+    @api.model
+    def _cron_puml_render(self, limit=PUML_RENDER_BATCH):
+        ''' Render up to limit queued diagrams, oldest first. Entries of each
+            module are claimed, rendered and released in their own
+            transactions, so finished diagrams are visible at once and entries
+            queued again while rendering are kept for next run. Entries left
+            rendering by a run killed on its time limit are recovered first.
+
+            :param int limit: maximum number of diagrams rendered by a run.
+        '''
+        Queue = self.env['puml.render.queue'].sudo()
+        Queue._puml_requeue_stuck(self._puml_render_deadline())
+        self.env.cr.commit()
+        queued = Queue.search([('state', '=', 'queued')], limit=limit)
+        for module in queued.mapped('module_id'):
+            signature = module._puml_signature()
+            claimed = queued.filtered(lambda entry: entry.module_id == module)._puml_claim(signature)
+            self.env.cr.commit()
+            if not claimed:
+                continue
+            failed = False
+            try:
+                module.with_context(puml_render_sync=True)._puml_get_diagrams(claimed.mapped('kind'))
+                self.env.cr.commit()
+            except Exception:
+                _logger.exception('Unable to render diagrams of module %s.', module.name)
+                self.env.cr.rollback()
+                self.invalidate_cache()
+                failed = True
+            try:
+                claimed._puml_release(signature, failed=failed)
+                self.env.cr.commit()
+            except psycopg2.Error:
+                # Queued again meanwhile, leave entries for next run.
+                self.env.cr.rollback()
+                self.invalidate_cache()
+        return True
+
+    def _compute_render_state(self):
+        entries = self.env['puml.render.queue'].sudo().search([('module_id', 'in', self.ids)])
+        states = {}
+        for entry in entries:
+            states.setdefault(entry.module_id.id, set()).add(entry.state)
+        for module in self:
+            pending = states.get(module.id, set())
+            module.puml_render_state = next(
+                (state for state in ['rendering', 'queued', 'failed'] if state in pending), 'done'
             )
-            module.puml_class_diagram_png = diagram.to_png_base64()
-            module.puml_class_diagram_uml = diagram.uml
+
+    @api.depends(*PUML_DEPENDS)
+    def _compute_dependency_diagram(self):
+        for module in self:
+            values = module._puml_get_diagrams(['dependency'])['dependency']
+            module.puml_dependency_diagram = values['puml']
+            module.puml_dependency_diagram_png = values['png']
+
+    @api.depends(*PUML_DEPENDS)
+    def _compute_inv_dependency_diagram(self):
+        for module in self:
+            values = module._puml_get_diagrams(['inv_dependency'])['inv_dependency']
+            module.puml_inv_dependency_diagram = values['puml']
+            module.puml_inv_dependency_diagram_png = values['png']
+
+    @api.depends(*PUML_DEPENDS)
+    def _compute_class_diagram(self):
+        for module in self:
+            values = module._puml_get_diagrams(['class'])['class']
+            module.puml_class_diagram = values['puml']
+            module.puml_class_diagram_png = values['png']
+            module.puml_class_diagram_uml = values['puml']
+
+    def _compute_diagram_log(self):
+        ''' Log of diagrams already produced, never render.
+        '''
+        for module in self:
+            signature = module._puml_signature()
+            logs = []
+            for kind in PUML_DIAGRAM_KINDS:
+                values = module._puml_read_attachments(kind, signature)
+                if values is not None and values['log']:
+                    logs.append(values['log'])
+            module.puml_diagram_log = '\n'.join(logs)
+
+    @api.multi
+    def action_puml_render(self):
+        ''' Render every diagram of modules again: stored diagrams are marked as
+            stale, so they are shown until the next cron run renders them, and
+            queued, failed ones included.
+        '''
+        for module in self:
+            self._puml_mark_stale(module._puml_attachments().filtered(
+                lambda att: att.name.split('.')[1] != PUML_STALE_SIGNATURE
+            ))
+        self._puml_enqueue(PUML_DIAGRAM_KINDS, force=True)
+        return True
+
+    @api.multi
+    def action_puml_refresh(self):
+        ''' Nothing to do, the form is read again after a button and shows
+            diagrams rendered in background meanwhile.
+        '''
+        return True
+
+    @api.multi
+    def action_puml_class_diagram(self):
+        ''' Open class diagram in a dialog, it is only produced on demand. The
+            dialog "Refresh" button opens it again with the diagram rendered
+            in background meanwhile.
+        '''
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Models Class Diagram'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'views': [(self.env.ref('odoo_uml.view_module_class_diagram_form').id, 'form')],
+            'target': 'new',
+        }
@@ -0,0 +1,66 @@
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+
+from odoo import models, fields, api
+
+
+class PumlDiagram(models.Model):
+    ''' Metadata of a diagram stored as module attachments, one entry by
+        module and diagram kind. The closure lists the modules the diagram
+        was read from, it is stale when one of them is installed, upgraded
+        or removed.
+    '''
+    _name = 'puml.diagram'
+    _description = 'Stored diagram metadata'
+    _order = 'id'
+
+    module_id = fields.Many2one(
+        'ir.module.module',
+        string=u'Module',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    kind = fields.Selection(
+        [
+            ('dependency', 'Dependency diagram'),
+            ('inv_dependency', 'Inverse dependency diagram'),
+            ('class', 'Class diagram'),
+        ],
+        string=u'Diagram',
+        required=True
+    )
+
+    closure = fields.Text(
+        string=u'Closure',
+        help='Names of modules the diagram was read from, one by line.'
+    )
+
+    _sql_constraints = [
+        ('module_kind_uniq', 'unique (module_id, kind)', 'A diagram is only stored once.'),
+    ]
+
+    @api.multi
+    def _puml_closure(self):
+        ''' Names of modules the diagram was read from.
+
+            :rtype: set
+        '''
+        self.ensure_one()
+        return set((self.closure or '').split('\n')) - {''}
+
+    @api.model
+    def _puml_set_closure(self, module, kind, closure):
+        ''' Store closure of the diagram of kind of module.
+
+            :param list closure: names of modules the diagram was read from.
+        '''
+        values = {'closure': '\n'.join(sorted(closure or []))}
+        diagram = self.search([('module_id', '=', module.id), ('kind', '=', kind)])
+        if diagram:
+            diagram.write(values)
+        else:
+            self.create(dict(values, module_id=module.id, kind=kind))
@@ -0,0 +1,127 @@
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class PumlRenderQueue(models.Model):
+    ''' Diagrams waiting for background rendering, one entry by module and
+        diagram kind. Entries are claimed and released with conditional
+        updates, so an entry queued again while it is rendered is never lost.
+    '''
+    _name = 'puml.render.queue'
+    _description = 'Diagrams waiting for background rendering'
+    _order = 'id'
+
+    module_id = fields.Many2one(
+        'ir.module.module',
+        string=u'Module',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    kind = fields.Selection(
+        [
+            ('dependency', 'Dependency diagram'),
+            ('inv_dependency', 'Inverse dependency diagram'),
+            ('class', 'Class diagram'),
+        ],
+        string=u'Diagram',
+        required=True
+    )
+
+    state = fields.Selection(
+        [
+            ('queued', 'Queued'),
+            ('rendering', 'Rendering'),
+            ('failed', 'Failed'),
+        ],
+        string=u'State',
+        required=True,
+        index=True,
+        default='queued'
+    )
+
+    signature = fields.Char(
+        string=u'Signature',
+        help='Module diagrams signature the entry was queued, rendered or failed for.'
+    )
+
+    retried = fields.Boolean(
+        string=u'Retried',
+        help='Queued again after a rendering run was interrupted, it is marked '
+             'as failed if it is interrupted again.'
+    )
+
+    _sql_constraints = [
+        ('module_kind_uniq', 'unique (module_id, kind)', 'A diagram is only queued once.'),
+    ]
+
+    @api.multi
+    def _puml_claim(self, signature):
+        ''' Mark queued entries as being rendered for signature.
+
+            :return: entries claimed, the ones claimed meanwhile by another
+                cron run are left out.
+            :rtype: PumlRenderQueue
+        '''
+        if not self:
+            return self
+        self.env.cr.execute("""
+            UPDATE puml_render_queue
+               SET state = 'rendering', signature = %s, write_date = (now() at time zone 'UTC')
+             WHERE id IN %s AND state = 'queued'
+         RETURNING id
+        """, (signature, tuple(self.ids)))
+        claimed = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.invalidate_cache()
+        return claimed
+
+    @api.model
+    def _puml_requeue_stuck(self, age):
+        ''' Recover entries left as being rendered for more than age seconds,
+            by a rendering run killed on its time limit. They are queued again
+            once, then marked as failed, so a diagram killing every run is not
+            rendered forever.
+
+            :param float age: seconds after which a rendering entry is stuck.
+        '''
+        self.env.cr.execute("""
+            UPDATE puml_render_queue
+               SET state = CASE WHEN retried THEN 'failed' ELSE 'queued' END,
+                   retried = TRUE, write_date = (now() at time zone 'UTC')
+             WHERE state = 'rendering'
+               AND write_date < (now() at time zone 'UTC') - %s * interval '1 second'
+         RETURNING id
+        """, (age,))
+        stuck = self.env.cr.fetchall()
+        if stuck:
+            _logger.warning('%s diagrams left rendering by an interrupted run recovered.', len(stuck))
+        self.invalidate_cache()
+
+    @api.multi
+    def _puml_release(self, signature, failed=False):
+        ''' Remove entries rendered for signature, or mark them as failed. Entries
+            queued again meanwhile are left for next run.
+        '''
+        if not self:
+            return
+        if failed:
+            self.env.cr.execute("""
+                UPDATE puml_render_queue
+                   SET state = 'failed', write_date = (now() at time zone 'UTC')
+                 WHERE id IN %s AND state = 'rendering' AND signature = %s
+            """, (tuple(self.ids), signature))
+        else:
+            self.env.cr.execute("""
+                DELETE FROM puml_render_queue
+                 WHERE id IN %s AND state = 'rendering' AND signature = %s
+            """, (tuple(self.ids), signature))
+        self.invalidate_cache()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+import os
+import hashlib
+import logging
+import threading
+from tempfile import NamedTemporaryFile
+
+_logger = logging.getLogger(__name__)
+
+#: Default cache size cap in bytes.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class RenderCache(object):
+    ''' Content-addressed on-disk cache of rendered diagrams.
+
+        Entries are keyed by a hash of the PlantUML source and the output
+        format, and stored as ``<dir>/<k[:2]>/<k>.<fmt>``. File modification
+        time is used as last access time, so when the total size goes over
+        ``max_size`` the least recently used entries are removed first. The
+        directory can be shared by several processes.
+    '''
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory  #: Cache root directory.
+        self.max_size = max_size    #: Size cap in bytes.
+        self.hits = 0
+        self.misses = 0
+        self._size = None           #: Estimated size, computed on first need.
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(uml, fmt='png'):
+        ''' Produce cache key for a source and output format.
+
+            :rtype: str
+        '''
+        return hashlib.sha1(('%s\0%s' % (fmt, uml)).encode('utf-8')).hexdigest()
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], '%s.%s' % (key, fmt))
+
+    def get(self, uml, fmt='png'):
+        ''' Return cached image or None. A hit refreshes the entry access time.
+
+            :rtype: bytes
+        '''
+        file_path = self._path(RenderCache.key(uml, fmt), fmt)
+        try:
+            with open(file_path, 'rb') as f_in:
+                data = f_in.read()
+            os.utime(file_path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, uml, data, fmt='png'):
+        ''' Store an image, evicting old entries if the cache is full.
+
+            :return: self
+            :rtype: RenderCache
+        '''
+        file_path = self._path(RenderCache.key(uml, fmt), fmt)
+        try:
+            if not os.path.isdir(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+        except OSError:
+            pass
+        try:
+            # An entry written again replaces the previous file, count the difference.
+            replaced = os.stat(file_path).st_size
+        except OSError:
+            replaced = 0
+        try:
+            # Write aside and rename, readers never see a partial file.
+            with NamedTemporaryFile(dir=os.path.dirname(file_path), delete=False) as f_out:
+                f_out.write(data)
+            os.rename(f_out.name, file_path)
+        except (IOError, OSError) as error:
+            _logger.warning('Unable to write render cache entry %s: %s', file_path, error)
+            return self
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            if self.size() > self.max_size:
+                self._evict()
+        return self
+
+    def _entries(self):
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            # Only "<k[:2]>" folders hold entries, the directory is shared with other data.
+            if os.path.dirname(root) != self.directory.rstrip(os.sep) or len(os.path.basename(root)) != 2:
+                continue
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_path))
+        return entries
+
+    def size(self):
+        ''' Total size of cached entries in bytes.
+
+            :rtype: int
+        '''
+        if self._size is None:
+            self._size = sum(size for _mtime, size, _path in self._entries())
+        return self._size
+
+    def _evict(self):
+        # Other processes write the same directory, so recount before evicting.
+        entries = sorted(self._entries())
+        total = sum(size for _mtime, size, _path in entries)
+        for _mtime, size, file_path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(file_path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def clear(self):
+        ''' Remove every cached entry.
+
+            :return: self
+            :rtype: RenderCache
+        '''
+        with self._lock:
+            for _mtime, _size, file_path in self._entries():
+                try:
+                    os.unlink(file_path)
+                except OSError:
+                    pass
+            self._size = 0
+        return self
+
+    def stats(self):
+        ''' Return cache counters.
+
+            :rtype: dict
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': self.size(),
+            'max_size': self.max_size,
+        }
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(directory, max_size=DEFAULT_MAX_SIZE):
+    ''' Return the shared cache for a directory, the size cap is updated.
+
+        :rtype: RenderCache
+    '''
+    with _CACHES_LOCK:
+        if directory not in _CACHES:
+            _CACHES[directory] = RenderCache(directory, max_size)
+        _CACHES[directory].max_size = max_size
+        return _CACHES[directory]
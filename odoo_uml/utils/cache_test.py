@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from cache import RenderCache
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = RenderCache(self.directory, max_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key(self):
+        self.assertEqual(RenderCache.key('A'), RenderCache.key('A', 'png'))
+        self.assertNotEqual(RenderCache.key('A'), RenderCache.key('A', 'svg'))
+        self.assertNotEqual(RenderCache.key('A'), RenderCache.key('B'))
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('A'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_hit(self):
+        self.cache.set('A', b'image-a')
+        self.assertEqual(self.cache.get('A'), b'image-a')
+        self.assertIsNone(self.cache.get('A', 'svg'))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'size': 7, 'max_size': 100})
+
+    def test_shared_directory(self):
+        self.cache.set('A', b'image-a')
+        self.assertEqual(RenderCache(self.directory).get('A'), b'image-a')
+
+    def test_overwrite(self):
+        self.cache.set('A', b'a' * 40)
+        self.assertEqual(self.cache.size(), 40)
+        self.cache.set('A', b'a' * 30)
+        self.cache.set('A', b'a' * 30)
+        self.assertEqual(self.cache.size(), 30)
+
+    def test_lru_eviction(self):
+        self.cache.set('A', b'a' * 40)
+        self.cache.set('B', b'b' * 40)
+        # Make "A" older than "B", then use it so "B" is the least recently used.
+        for uml, mtime in (('A', 1000), ('B', 2000)):
+            path = self.cache._path(RenderCache.key(uml), 'png')
+            os.utime(path, (mtime, mtime))
+        self.cache.get('A')
+        self.cache.set('C', b'c' * 40)
+        self.assertIsNone(self.cache.get('B'))
+        self.assertIsNotNone(self.cache.get('A'))
+        self.assertIsNotNone(self.cache.get('C'))
+        self.assertLessEqual(self.cache.size(), 100)
+
+    def test_foreign_files(self):
+        os.makedirs(os.path.join(self.directory, 'snapshot'))
+        with open(os.path.join(self.directory, 'snapshot', 'data.json'), 'w') as f_out:
+            f_out.write('x' * 1000)
+        self.cache.set('A', b'image-a')
+        self.assertEqual(self.cache.size(), 7)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'snapshot', 'data.json')))
+
+    def test_clear(self):
+        self.cache.set('A', b'image-a')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('A'))
+        self.assertEqual(self.cache.size(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+import heapq
+from collections import deque
+
+
+class DependencyGraph(object):
+    ''' Module dependency graph held in memory, with forward (module to its
+        dependencies) and reverse (module to its dependents) adjacency.
+
+        :param dict depends: dependency names by module name, dependencies
+            which are not modules of the graph are ignored.
+    '''
+
+    def __init__(self, depends):
+        self._forward = {}   #: Dependencies by module, in declaration order.
+        self._reverse = {}   #: Dependents by module, sorted by name.
+        for name in depends:
+            self._forward[name] = []
+            self._reverse[name] = []
+        for name, names in depends.items():
+            for dependency in names:
+                if dependency in self._forward and dependency not in self._forward[name]:
+                    self._forward[name].append(dependency)
+                    self._reverse[dependency].append(name)
+        for names in self._reverse.values():
+            names.sort()
+        self._order = None
+        self._rank = None
+        self._depth = None
+
+    def __contains__(self, name):
+        return name in self._forward
+
+    def __len__(self):
+        return len(self._forward)
+
+    def depends(self, name):
+        ''' Direct dependencies of a module.
+
+            :rtype: list
+        '''
+        return self._forward.get(name, [])
+
+    def dependents(self, name):
+        ''' Modules depending directly on a module.
+
+            :rtype: list
+        '''
+        return self._reverse.get(name, [])
+
+    def bfs(self, name, reverse=False, max_depth=None):
+        ''' Walk the graph breadth first from a module, each module is reached
+            once at its shortest distance.
+
+            :param str name: start module.
+            :param bool reverse: follow dependents instead of dependencies.
+            :param int max_depth: stop at this distance, None walks the whole graph.
+            :return: (module name, distance) pairs, start module first.
+            :rtype: generator
+        '''
+        if name not in self._forward:
+            return
+        adjacency = self._reverse if reverse else self._forward
+        seen, queue = {name}, deque([(name, 0)])
+        while queue:
+            node, distance = queue.popleft()
+            yield node, distance
+            if max_depth is not None and distance >= max_depth:
+                continue
+            for neighbour in adjacency[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append((neighbour, distance + 1))
+
+    def closure(self, name, reverse=False):
+        ''' Transitive closure of a module, the module included.
+
+            :rtype: set
+        '''
+        return set(node for node, _distance in self.bfs(name, reverse=reverse))
+
+    def frontier(self, name, reverse=False, max_depth=None):
+        ''' Modules up to max_depth hops from a module with neighbours farther
+            away, empty when max_depth is not set.
+
+            :param str name: start module.
+            :param bool reverse: follow dependents instead of dependencies.
+            :param int max_depth: radius of the modules kept.
+            :return: neighbours beyond max_depth by module within it.
+            :rtype: dict
+        '''
+        if not max_depth:
+            return {}
+        adjacency = self._reverse if reverse else self._forward
+        radius = set(node for node, _distance in self.bfs(name, reverse=reverse, max_depth=max_depth))
+        result = {}
+        for node in radius:
+            hidden = [neighbour for neighbour in adjacency[node] if neighbour not in radius]
+            if hidden:
+                result[node] = hidden
+        return result
+
+    def topological_order(self):
+        ''' Modules sorted so dependencies come before their dependents, ties
+            are sorted by name. Modules in a cycle come last.
+
+            :rtype: list
+        '''
+        if self._order is None:
+            pending = {name: len(names) for name, names in self._forward.items()}
+            ready = [name for name, count in pending.items() if not count]
+            heapq.heapify(ready)
+            order = []
+            while ready:
+                name = heapq.heappop(ready)
+                order.append(name)
+                for dependent in self._reverse[name]:
+                    pending[dependent] -= 1
+                    if not pending[dependent]:
+                        heapq.heappush(ready, dependent)
+            done = set(order)
+            order.extend(sorted(name for name in self._forward if name not in done))
+            self._order = order
+        return self._order
+
+    def rank(self, name):
+        ''' Position of a module in :py:meth:`topological_order`.
+
+            :rtype: int
+        '''
+        if self._rank is None:
+            self._rank = {node: index for index, node in enumerate(self.topological_order())}
+        return self._rank[name]
+
+    def depth(self, name):
+        ''' Length of the longest dependency chain below a module, 0 for a
+            module without dependencies.
+
+            :rtype: int
+        '''
+        if self._depth is None:
+            self._depth = {}
+            for node in self.topological_order():
+                self._depth[node] = max(
+                    [self._depth.get(dependency, 0) + 1 for dependency in self._forward[node]] or [0]
+                )
+        return self._depth[name]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from depgraph import DependencyGraph
+
+
+def graph():
+    return DependencyGraph({
+        'base': [],
+        'web': ['base'],
+        'mail': ['base', 'web'],
+        'sale': ['mail', 'missing'],
+        'stock': ['mail'],
+        'sale_stock': ['sale', 'stock'],
+    })
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def test_adjacency(self):
+        self.assertEqual(graph().depends('sale'), ['mail'])
+        self.assertEqual(graph().dependents('mail'), ['sale', 'stock'])
+        self.assertEqual(graph().depends('missing'), [])
+        self.assertIn('sale', graph())
+        self.assertEqual(len(graph()), 6)
+
+    def test_bfs(self):
+        self.assertEqual(list(graph().bfs('sale_stock')), [
+            ('sale_stock', 0), ('sale', 1), ('stock', 1), ('mail', 2), ('base', 3), ('web', 3)
+        ])
+        self.assertEqual(list(graph().bfs('mail', reverse=True, max_depth=1)), [
+            ('mail', 0), ('sale', 1), ('stock', 1)
+        ])
+        self.assertEqual(list(graph().bfs('missing')), [])
+
+    def test_closure(self):
+        self.assertEqual(graph().closure('sale'), {'sale', 'mail', 'web', 'base'})
+        self.assertEqual(graph().closure('web', reverse=True), {'web', 'mail', 'sale', 'stock', 'sale_stock'})
+
+    def test_frontier(self):
+        self.assertEqual(graph().frontier('sale_stock', max_depth=2), {'mail': ['base', 'web']})
+        self.assertEqual(graph().frontier('sale_stock'), {})
+        self.assertEqual(graph().frontier('sale_stock', max_depth=0), {})
+        self.assertEqual(graph().frontier('base', reverse=True, max_depth=1), {'mail': ['sale', 'stock']})
+
+    def test_frontier_fan_out(self):
+        # Five branches from "a", "x" and "y" depend on several of them: each
+        # branch reaching a hidden module is in the frontier.
+        fan = DependencyGraph({
+            'a': [], 'a1': ['a'], 'a2': ['a'], 'a3': ['a'], 'a4': ['a'], 'a5': ['a'],
+            'x': ['a1', 'a4'], 'y': ['a2', 'a4'],
+        })
+        frontier = fan.frontier('a', reverse=True, max_depth=1)
+        self.assertEqual(frontier, {'a1': ['x'], 'a2': ['y'], 'a4': ['x', 'y']})
+        self.assertEqual(set().union(*frontier.values()), {'x', 'y'})
+
+    def test_topological(self):
+        order = graph().topological_order()
+        self.assertEqual(order, ['base', 'web', 'mail', 'sale', 'stock', 'sale_stock'])
+        self.assertLess(graph().rank('mail'), graph().rank('sale'))
+
+    def test_depth(self):
+        self.assertEqual([graph().depth(name) for name in ['base', 'web', 'mail', 'sale_stock']], [0, 1, 2, 4])
+
+    def test_cycle(self):
+        cyclic = DependencyGraph({'a': ['b'], 'b': ['a'], 'c': []})
+        self.assertEqual(cyclic.topological_order(), ['c', 'a', 'b'])
+        self.assertEqual(cyclic.closure('a'), {'a', 'b'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+import re
+
+try:
+    from .plant_uml import StringUtil
+except (ImportError, ValueError):
+    from plant_uml import StringUtil
+
+HEX_COLOR = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+def quote(string):
+    return '"{0}"'.format(str(string).replace('\\', '\\\\').replace('"', '\\"').replace('\\\\n', '\\n'))
+
+
+def dot_color(string):
+    ''' Translate a PlantUML color (#Yellow, #DDDDDD) into a Graphviz one, named
+        colors are taken from the svg color scheme.
+    '''
+    if HEX_COLOR.match(string):
+        return string
+    return string.lstrip('#').lower()
+
+
+class DotDigraph(StringUtil):
+    ''' Graphviz DOT directed graph builder. Package methods mirror
+        :py:class:`odoo_uml.utils.plant_uml.PlantUMLClassDiagram` ones, so
+        package diagrams can be produced with any of both.
+    '''
+
+    def __init__(self, title=None):
+        super(DotDigraph, self).__init__()
+        self.title = title
+
+    def begin_graph(self):
+        self.append('digraph G {').push().newline()
+        if self.title is not None:
+            self.append('label={0}; labelloc=t; fontsize=18;'.format(quote(self.title))).newline()
+        self.append('node [shape=tab, style=filled, fillcolor=white, colorscheme=svg, fontname=Helvetica];').newline()
+        return self.append('edge [style=dashed, arrowhead=open];').newline()
+
+    def end_graph(self):
+        self.pop()
+        self.buffer = self.buffer.rstrip('\t')
+        return self.append('}')
+
+    def add_node(self, alias, label, **attrs):
+        ''' Add a node, alias is quoted so any name is a valid DOT identifier
+            (keywords like "graph" or names starting with a digit included).
+        '''
+        tokens = ['label={0}'.format(quote(label))]
+        for key in sorted(attrs):
+            if attrs[key] is not None:
+                tokens.append('{0}={1}'.format(key, quote(attrs[key])))
+        return self.append('{0} [{1}];'.format(quote(alias), ', '.join(tokens))).newline()
+
+    def add_edge(self, alias1, alias2, **attrs):
+        tokens = ['{0}={1}'.format(key, quote(attrs[key])) for key in sorted(attrs) if attrs[key] is not None]
+        if tokens:
+            return self.append('{0} -> {1} [{2}];'.format(quote(alias1), quote(alias2), ', '.join(tokens))).newline()
+        return self.append('{0} -> {1};'.format(quote(alias1), quote(alias2))).newline()
+
+    def begin_package(self, name, stereotype=None, color=None, alias=None):
+        label = name if stereotype is None else u'«{0}»\\n{1}'.format(stereotype, name)
+        return self.add_node(
+            alias if alias is not None else name,
+            label,
+            fillcolor=dot_color(color) if color is not None else None
+        )
+
+    def end_package(self):
+        return self
+
+    def add_dependency(self, name1='NoName1', name2='NoName2', alias1=None, alias2=None):
+        return self.add_edge(
+            alias1 if alias1 is not None else name1,
+            alias2 if alias2 is not None else name2
+        )
+
+    def add_floating_note(self, note, alias):
+        return self.add_node(alias, note, shape='note', fillcolor='lightyellow')
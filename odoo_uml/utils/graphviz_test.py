@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from graphviz import *
+
+
+class TestDot(unittest.TestCase):
+    def test_quote(self):
+        self.assertEqual(quote('a'), '"a"')
+        self.assertEqual(quote('a "b"'), '"a \\"b\\""')
+        self.assertEqual(quote('a\\nb'), '"a\\nb"')
+
+    def test_dot_color(self):
+        self.assertEqual(dot_color('#Yellow'), 'yellow')
+        self.assertEqual(dot_color('#LightYellow'), 'lightyellow')
+        self.assertEqual(dot_color('#DDDDDD'), '#DDDDDD')
+
+
+class TestDotDigraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = DotDigraph()
+
+    def test_begin_graph(self):
+        self.assertEqual(
+            self.graph.begin_graph().end_graph().output(),
+            'digraph G {\n'
+            '\tnode [shape=tab, style=filled, fillcolor=white, colorscheme=svg, fontname=Helvetica];\n'
+            '\tedge [style=dashed, arrowhead=open];\n'
+            '}'
+        )
+
+    def test_title(self):
+        self.assertIn('label="Demo"; labelloc=t;', DotDigraph(title='Demo').begin_graph().output())
+
+    def test_add_node(self):
+        self.assertEqual(
+            self.graph.add_node('a', 'A', shape='note', fillcolor=None).output(),
+            '"a" [label="A", shape="note"];\n'
+        )
+
+    def test_add_edge(self):
+        self.assertEqual(self.graph.add_edge('a', 'b').output(), '"a" -> "b";\n')
+
+    def test_keyword_ids(self):
+        self.assertEqual(
+            self.graph.add_node('graph', 'graph').add_edge('node', '2fa').output(),
+            '"graph" [label="graph"];\n"node" -> "2fa";\n'
+        )
+
+    def test_begin_package(self):
+        self.assertEqual(
+            self.graph
+            .begin_package('demo', stereotype='module', alias='pd0000', color='#Yellow')
+            .end_package()
+            .output(),
+            '"pd0000" [label="«module»\\ndemo", fillcolor="yellow"];\n'
+        )
+
+    def test_add_dependency(self):
+        self.assertEqual(
+            self.graph.add_dependency(alias1='a', alias2='b').output(),
+            '"a" -> "b";\n'
+        )
+        self.assertEqual(
+            DotDigraph().add_dependency('A', 'B').output(),
+            '"A" -> "B";\n'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
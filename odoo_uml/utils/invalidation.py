@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+
+
+def changed_modules(previous, current):
+    ''' Return names of modules installed, upgraded or removed between two
+        module states, see ``ir.module.module._puml_module_versions``.
+
+        :param dict previous: state of modules by name, as recorded last time.
+        :param dict current: state of modules by name.
+        :rtype: set
+    '''
+    return set(name for name in set(previous) | set(current) if previous.get(name) != current.get(name))
+
+
+def is_stale(kind, closure, changed, touched):
+    ''' Check if a stored diagram must be rendered again. Diagrams stored
+        without closure are always stale. Inverse dependency diagrams are
+        also stale when a changed module depends on one of their modules,
+        it may be a new dependent.
+
+        :param str kind: diagram kind.
+        :param set closure: names of modules the diagram was read from.
+        :param set changed: names of changed modules, see :py:func:`changed_modules`.
+        :param set touched: changed modules and their dependencies.
+        :rtype: bool
+    '''
+    if not closure:
+        return True
+    return bool(set(closure) & (touched if kind == 'inv_dependency' else changed))
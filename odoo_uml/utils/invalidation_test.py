@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from invalidation import changed_modules, is_stale
+
+
+class TestChangedModules(unittest.TestCase):
+    def test_upgrade_without_version_bump(self):
+        # "-u sale" keeps state and version, only write_date changes.
+        previous = {
+            'base': ['installed', '11.0.1.3', '2026-01-01 10:00:00'],
+            'sale': ['installed', '11.0.1.0', '2026-01-01 10:00:00'],
+        }
+        current = {
+            'base': ['installed', '11.0.1.3', '2026-01-01 10:00:00'],
+            'sale': ['installed', '11.0.1.0', '2026-02-01 09:30:00'],
+        }
+        self.assertEqual(changed_modules(previous, current), {'sale'})
+
+    def test_install_and_removal(self):
+        previous = {'base': ['installed', '1', 'a'], 'old': ['installed', '1', 'a']}
+        current = {'base': ['installed', '1', 'a'], 'new': ['installed', '1', 'b']}
+        self.assertEqual(changed_modules(previous, current), {'old', 'new'})
+
+    def test_unchanged(self):
+        modules = {'base': ['installed', '1', 'a']}
+        self.assertEqual(changed_modules(modules, dict(modules)), set())
+
+
+class TestIsStale(unittest.TestCase):
+    def test_changed_module_in_closure(self):
+        changed = changed_modules(
+            {'sale': ['installed', '1', 'a'], 'stock': ['installed', '1', 'a']},
+            {'sale': ['installed', '1', 'b'], 'stock': ['installed', '1', 'a']}
+        )
+        self.assertTrue(is_stale('class', {'base', 'sale'}, changed, changed))
+        self.assertTrue(is_stale('dependency', {'sale'}, changed, changed))
+        self.assertFalse(is_stale('class', {'base', 'stock'}, changed, changed))
+
+    def test_inverse_dependency(self):
+        # A new dependent of "mail" changes its inverse dependency diagram only.
+        changed, touched = {'mail_extra'}, {'mail_extra', 'mail'}
+        self.assertTrue(is_stale('inv_dependency', {'mail', 'base'}, changed, touched))
+        self.assertFalse(is_stale('dependency', {'mail', 'base'}, changed, touched))
+
+    def test_without_closure(self):
+        self.assertTrue(is_stale('class', set(), set(), set()))
+        self.assertTrue(is_stale('class', None, set(), set()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,20 +3,26 @@
 #    License, author and contributors information in:                         #
 #    __manifest__.py file at the root folder of this module.                  #
 ###############################################################################
+import os
 import logging
+import hashlib
 import inspect
-from os import path, unlink
-from subprocess import Popen
+import shutil
+from os import path
 from base64 import b64encode
-from tempfile import NamedTemporaryFile
 
 from odoo import models, _
+from odoo.tools import config
 from .plant_uml import PlantUMLClassDiagram, italic, bold
+from .render import FallbackRenderer, HttpBackend, JarBackend, PipeBackend, RenderError, render_dot, run_command
+from .graphviz import DotDigraph
+from .cache import DEFAULT_MAX_SIZE, get_cache
+from .snapshot import FieldInfo, MetadataSnapshot, MethodInfo, ModelInfo, ModuleInfo
 
-PIPE = -1
 PLANT_UML_PATH = path.realpath(
     path.join(path.dirname(__file__), '..', 'bin', 'plantuml.jar')
 )
+DEFAULT_RENDER_TIMEOUT = 60  #: Render wall-clock limit in seconds.
 
 API_DECORATORS = [
     'multi',
@@ -37,101 +43,313 @@ API_DECORATORS = [
     'v8'
 ]
 
-def getmembers(object, predicate=None):
-    """
-        Return all members of an object as (name, value) pairs sorted by name.
-        Optionally, only return members that satisfy a given predicate.
-    """
-    if inspect.isclass(object):
-        mro = (object,) + inspect.getmro(object)
-    else:
-        mro = ()
-    results = []
-    processed = set()
-    names = dir(object)
-    # :dd any DynamicClassAttributes to the list of names if object is a class;
-    # this may result in duplicate entries if, for example, a virtual
-    # attribute with the same name as a DynamicClassAttribute exists
-    try:
-        for base in object.__bases__:
-            for k, v in base.__dict__.items():
-                if isinstance(v, inspect.types.DynamicClassAttribute):
-                    names.append(k)
-    except AttributeError:
-        pass
-    for key in names:
-        # First try to get the value via getattr.  Some descriptors don't
-        # like calling their __get__ (see bug #1785), so fall back to
-        # looking in the __dict__.
-        try:
-            try:
-                value = getattr(object, key)
-            except Exception:
-                pass
-
-            # handle the duplicate key
-            if key in processed:
-                raise AttributeError
-        except AttributeError:
-
-            for base in mro:
-                if key in base.__dict__:
-                    value = base.__dict__[key]
-                    break
-            else:
-                # could be a (currently) missing slot member, or a buggy
-                # __dir__; discard and move on
+def MEMBERS(CLS):
+    ''' Return methods of a class, or of the class of a record, as a hash of name
+        and function. Only the ``__dict__`` of classes in the MRO is read, so field
+        descriptors are never evaluated (no record read nor prefetch). Class
+        methods are unwrapped, static methods and other attributes are ignored.
+
+        :rtype: dict
+    '''
+    if not inspect.isclass(CLS):
+        CLS = type(CLS)
+    members = {}
+    for klass in CLS.__mro__:
+        for name, value in vars(klass).items():
+            if name in members:
                 continue
-        if not predicate or predicate(value):
-            results.append((key, value))
-        processed.add(key)
-    results.sort(key=lambda pair: pair[0])
-    return results
+            if isinstance(value, classmethod):
+                value = value.__func__
+            elif isinstance(value, staticmethod) or not inspect.isfunction(value):
+                # Shadows members of further bases as getattr does.
+                value = None
+            members[name] = value
+    return {name: value for name, value in members.items() if value is not None}
+
+
+def addon_of(function):
+    ''' Return name of the addon defining function, None out of addons.
+
+        :rtype: str
+    '''
+    parts = (getattr(function, '__module__', None) or '').split('.')
+    if len(parts) > 2 and parts[:2] == ['odoo', 'addons']:
+        return parts[2]
+    return None
 
 
 def GET_METHODS(CLS, module_name=None):
-    members = getmembers(CLS, predicate=lambda m: inspect.ismethod(m))
+    members = MEMBERS(CLS)
+    if module_name:
+        return sorted(name for name, value in members.items() if addon_of(value) == module_name)
+    return sorted(members)
+
+
+#: Methods of Odoo base model classes, computed on first use.
+_BASE_METHODS = {}
 
-    methods = []
-    for name, value in members:
-        if module_name:
-            try:
-                module = str(inspect.getmodule(value))
-                if module_name in module:
-                    methods.append(name)
-            except AttributeError:
-                pass
-        else:
-            methods.append(name)
 
-    return methods
+def BASE_METHODS(CLS):
+    ''' Return methods of an Odoo base model class (models.Model,
+        models.AbstractModel or models.TransientModel), see :py:func:`MEMBERS`.
+
+        :rtype: dict
+    '''
+    if CLS not in _BASE_METHODS:
+        _BASE_METHODS[CLS] = MEMBERS(CLS)
+    return _BASE_METHODS[CLS]
 
-BASE_MODEL_METHODS = GET_METHODS(models.Model)
-BASE_ABSTRACT_METHODS = GET_METHODS(models.AbstractModel)
-BASE_TRANSIENT_METHODS = GET_METHODS(models.TransientModel)
 EXCLUDE_METHODS = []
 
 _logger = logging.getLogger(__name__)
 
+#: Field object properties kept in snapshots as flags, see :py:class:`FieldInfo`.
+FIELD_FLAGS = (
+    'states', 'index', 'translate', 'groups', 'domain', 'compute', 'inverse', 'search',
+    'company_dependent', 'readonly', 'store', 'copy', 'manual', 'required', 'auto_join',
+    'delegate'
+)
+
+#: ir.model.fields columns kept in snapshots.
+FIELD_COLUMNS = ('name', 'model', 'ttype', 'relation', 'relation_table', 'size', 'on_delete')
+
+#: ir.module.module columns kept in snapshots.
+MODULE_COLUMNS = (
+    'name', 'state', 'latest_version', 'application', 'auto_install', 'summary', 'shortdesc', 'author'
+)
+
+
+def snapshot_signature(env):
+    ''' Return signature of the metadata snapshots are extracted from: modules
+        state, version and last write, and last change of fields (custom ones
+        included). The loader writes each module it installs or upgrades, so
+        code changes of methods or model options are covered too.
+
+        :rtype: str
+    '''
+    env.cr.execute("SELECT name, state, latest_version, write_date FROM ir_module_module ORDER BY name")
+    modules = env.cr.fetchall()
+    env.cr.execute("SELECT count(*), max(write_date) FROM ir_model_fields")
+    return hashlib.sha1(repr((env.cr.dbname, modules, env.cr.fetchall())).encode('utf-8')).hexdigest()
+
+
+def _model_info(row, cls, fields):
+    methods = {}
+    for name, function in MEMBERS(cls).items():
+        addon = addon_of(function)
+        if addon is None:
+            continue
+        try:
+            params = inspect.formatargspec(*inspect.getargspec(function))[1:-1]
+        except (TypeError, ValueError):
+            params = str(inspect.signature(function))[1:-1]
+        api = getattr(function, '_api', None)
+        methods[name] = MethodInfo(
+            name=name,
+            params=params,
+            api=api if isinstance(api, str) else None,
+            module=addon,
+            origin='{0}.{1}'.format(function.__module__, function.__qualname__)
+        )
+    return ModelInfo(
+        model=row['model'],
+        name=row['name'],
+        transient=row['transient'],
+        abstract=cls._abstract,
+        inherit=list(cls._inherit) if isinstance(cls._inherit, (list, tuple)) else cls._inherit,
+        inherits=dict(cls._inherits),
+        table=cls._table,
+        auto=cls._auto,
+        date_name=cls._date_name,
+        fold_name=cls._fold_name,
+        rec_name=cls._rec_name,
+        order=cls._order,
+        parent_name=cls._parent_name,
+        parent_store=cls._parent_store,
+        parent_order=cls._parent_order,
+        fields=fields,
+        methods=methods
+    )
+
+
+def _field_info(row, modules, field):
+    values = {key: row[key] for key in FIELD_COLUMNS}
+    values['modules'] = modules
+    if field is not None:
+        values.update({key: bool(getattr(field, key, None)) for key in FIELD_FLAGS})
+        args = getattr(field, 'args', None) or {}
+        values.update(
+            related=list(field.related) if getattr(field, 'related', None) else None,
+            inverse_name=getattr(field, 'inverse_name', None),
+            group_operator=field.group_operator if 'group_operator' in args else None,
+            default=callable(getattr(field, 'default', None)),
+            column1=getattr(field, 'column1', None),
+            column2=getattr(field, 'column2', None)
+        )
+        if row['ttype'] == 'many2many':
+            values['relation_table'] = getattr(field, 'relation', None) or row['relation_table']
+    return FieldInfo(**values)
+
+
+def build_snapshot(env, signature=None, models=True):
+    ''' Extract modules, dependencies, models, fields and methods of a database
+        with a few batched queries.
+
+        :param odoo.api.Environment env: environment.
+        :param str signature: see :py:func:`snapshot_signature`.
+        :param bool models: extract models, fields and methods too, package
+            diagrams only need modules and dependencies.
+        :rtype: MetadataSnapshot
+    '''
+    modules, names = {}, {}
+    for row in env['ir.module.module'].sudo().search_read([], list(MODULE_COLUMNS), order='name'):
+        names[row['id']] = row['name']
+        modules[row['name']] = ModuleInfo(depends=[], **{key: row[key] for key in MODULE_COLUMNS})
+    for row in env['ir.module.module.dependency'].sudo().search_read([], ['name', 'module_id'], order='id'):
+        if row['module_id'] and row['module_id'][0] in names:
+            modules[names[row['module_id'][0]]].depends.append(row['name'])
+    if not models:
+        return MetadataSnapshot(modules, {}, {}, {}, signature=signature)
+
+    # Same as ir.model modules field: installed modules with an xml id.
+    env.cr.execute("""
+        SELECT d.module, m.model
+          FROM ir_model_data d
+          JOIN ir_model m ON m.id = d.res_id
+          JOIN ir_module_module mod ON mod.name = d.module AND mod.state = 'installed'
+         WHERE d.model = 'ir.model'
+      ORDER BY m.model
+    """)
+    module_models = {}
+    for module_name, model_name in env.cr.fetchall():
+        module_models.setdefault(module_name, []).append(model_name)
+
+    # Same as ir.model.fields modules field: installed modules with an xml id.
+    env.cr.execute("""
+        SELECT d.res_id, d.module
+          FROM ir_model_data d
+          JOIN ir_module_module m ON m.name = d.module AND m.state = 'installed'
+         WHERE d.model = 'ir.model.fields'
+      ORDER BY d.module
+    """)
+    field_modules = {}
+    for field_id, module_name in env.cr.fetchall():
+        field_modules.setdefault(field_id, []).append(module_name)
+    fields = {}
+    for row in env['ir.model.fields'].sudo().search_read([], ['id'] + list(FIELD_COLUMNS), order='name'):
+        if row['model'] not in env.registry:
+            continue
+        field = env.registry[row['model']]._fields.get(row['name'])
+        fields.setdefault(row['model'], []).append(_field_info(row, field_modules.get(row['id'], []), field))
+
+    models_info = {}
+    for row in env['ir.model'].sudo().search_read([], ['model', 'name', 'transient']):
+        if row['model'] not in env.registry:
+            continue
+        models_info[row['model']] = _model_info(row, env.registry[row['model']], fields.get(row['model'], []))
+
+    base_methods = {
+        'model': sorted(BASE_METHODS(models.Model)),
+        'transient': sorted(BASE_METHODS(models.TransientModel)),
+        'abstract': sorted(BASE_METHODS(models.AbstractModel)),
+    }
+    return MetadataSnapshot(modules, models_info, module_models, base_methods, signature=signature)
+
+
+def cache_directory(env):
+    ''' Return directory of rendered diagrams and metadata snapshots
+        (``odoo_uml.cache_dir`` parameter, default to "odoo_uml" in the database
+        filestore).
+
+        :rtype: str
+    '''
+    return env['ir.config_parameter'].sudo().get_param('odoo_uml.cache_dir') or path.join(
+        config.filestore(env.cr.dbname), 'odoo_uml'
+    )
+
+
+def render_timeout(env):
+    ''' Return render wall-clock limit in seconds for a diagram
+        (``odoo_uml.render_timeout`` parameter, default 60).
+
+        :rtype: float
+    '''
+    timeout = env['ir.config_parameter'].sudo().get_param('odoo_uml.render_timeout')
+    try:
+        return float(timeout) if timeout else DEFAULT_RENDER_TIMEOUT
+    except ValueError:
+        _logger.warning('Ignore invalid odoo_uml.render_timeout parameter: %s', timeout)
+        return DEFAULT_RENDER_TIMEOUT
+
+
+def get_snapshot(env, models=True):
+    ''' Return metadata snapshot of env database. It is kept in the registry
+        and in a file of the cache directory shared by all workers, it is only
+        extracted again when its signature changes.
+
+        :param bool models: with models, fields and methods. Without them only
+            modules and dependencies are extracted, kept in the registry only,
+            unless the full snapshot is already there.
+        :rtype: MetadataSnapshot
+    '''
+    signature = snapshot_signature(env)
+    cache = UtilMixin.registry_cache(env, 'snapshot')
+    if cache.get('signature') == signature:
+        return cache['snapshot']
+    if not models:
+        cache = UtilMixin.registry_cache(env, 'module_snapshot')
+        if cache.get('signature') != signature:
+            cache['snapshot'], cache['signature'] = build_snapshot(env, signature, models=False), signature
+        return cache['snapshot']
+
+    # Cache directory can be shared by several databases, each one has its own folder.
+    directory = path.join(cache_directory(env), 'snapshot', env.cr.dbname)
+    file_path = path.join(directory, '{0}.json'.format(signature))
+    snapshot = MetadataSnapshot.load(file_path, signature)
+    if snapshot is None:
+        snapshot = build_snapshot(env, signature)
+        try:
+            snapshot.dump(file_path)
+            # Snapshots of previous signatures of the database are useless now.
+            for name in os.listdir(directory):
+                if name != path.basename(file_path) and name.endswith('.json'):
+                    os.unlink(path.join(directory, name))
+        except (IOError, OSError) as error:
+            _logger.warning('Unable to write metadata snapshot %s: %s', file_path, error)
+    cache['snapshot'], cache['signature'] = snapshot, signature
+    return snapshot
+
 
 class UtilMixin(object):
     @staticmethod
-    def execute_cmd(*args):
-        ''' Execute external command in system context.
+    def execute_cmd(*args, **kwargs):
+        ''' Execute external command in system context. Output streams are
+            read concurrently and the command is killed when it runs longer
+            than timeout.
 
             :param list *args: a list of string to build and exec command.
-            :return: excecution standar output.
-            :rtype: str
+            :param bytes input: data sent to command standard input.
+            :param float timeout: wall-clock limit in seconds, None waits forever.
+            :return: exit status, outputs, elapsed time and timeout flag.
+            :rtype: CommandResult
         '''
         _logger.info('Run external command: %s.', ' '.join(args))
-        process = Popen(args, stdout=PIPE, stderr=PIPE)
-        std_out = str()
-        while process.poll() is None:
-            line = process.stdout.readline()
-            if line:
-                std_out += line
-                _logger.info(line)
-        return std_out
+        result = run_command(args, input=kwargs.get('input', None), timeout=kwargs.get('timeout', None))
+        if result.timed_out:
+            _logger.warning('External command killed after %.3fs: %s.', result.elapsed, ' '.join(args))
+        elif result.returncode or result.stderr:
+            _logger.info(result.to_log())
+        return result
+
+    @staticmethod
+    def registry_cache(env, name):
+        ''' Return a named cache attached to the registry of env, it is dropped
+            with the registry when modules are loaded or updated.
+
+            :rtype: dict
+        '''
+        caches = env.registry.__dict__.setdefault('_odoo_uml_caches', {})
+        return caches.setdefault(name, {})
 
     @staticmethod
     def produce_alias(string):
@@ -146,46 +364,148 @@ class UtilMixin(object):
         '''
         raise NotImplementedError()
 
+    def render_source(self):
+        ''' Return source to render and its engine, "plantuml" or "dot".
+
+            :rtype: tuple
+        '''
+        return self.to_puml(), 'plantuml'
+
     def to_png_base64(self):
         ''' Return diagram as PNG in base64 encode.
 
             :return: image as base64 encoded.
             :rtype: string
         '''
-        b64image, self.log, self.uml = self._produce_diagram_image()
-        return b64image
-
-    def _produce_diagram_image(self):
-        f_out_puml = NamedTemporaryFile(mode='w', delete=False)
-        uml = self.to_puml()
-        f_out_puml.write(uml)
-        f_out_puml.close()
-
-        log = UtilMixin.execute_cmd(
-            'java', '-jar', PLANT_UML_PATH, '-tpng', '-v',
-            f_out_puml.name, '-o', '"%s"' % path.dirname(f_out_puml.name)
-        )
+        return UtilMixin.render_png_base64([self])[0]
 
-        f_out_diagram = open("%s.png" % f_out_puml.name,'rb')
-        image = b64encode(f_out_diagram.read())
-        f_out_diagram.close()
+    def render_cache(self):
+        ''' Return the on-disk render cache configured for diagram environment
+            (see :py:func:`cache_directory` and ``odoo_uml.cache_max_size``
+            parameter). A size of 0 disables the cache.
 
-        unlink(f_out_puml.name)
-        unlink(f_out_diagram.name)
+            :return: a cache or None.
+            :rtype: RenderCache
+        '''
+        env = getattr(self, '_config', {}).get('env', None)
+        if env is None:
+            return None
+        max_size = env['ir.config_parameter'].sudo().get_param('odoo_uml.cache_max_size')
+        try:
+            max_size = int(max_size) if max_size else DEFAULT_MAX_SIZE
+        except ValueError:
+            _logger.warning('Ignore invalid odoo_uml.cache_max_size parameter: %s', max_size)
+            max_size = DEFAULT_MAX_SIZE
+        if max_size <= 0:
+            return None
+        return get_cache(cache_directory(env), max_size)
+
+    def render_timeout(self):
+        ''' Return render wall-clock limit in seconds for a diagram, see
+            :py:func:`render_timeout`.
+
+            :rtype: float
+        '''
+        env = getattr(self, '_config', {}).get('env', None)
+        if env is None:
+            return DEFAULT_RENDER_TIMEOUT
+        return render_timeout(env)
 
-        return image, log, uml
+    @staticmethod
+    def render_png_base64(diagrams, processes=1):
+        ''' Render several diagrams as PNG in a single renderer call. Sets
+            ``log`` and ``uml`` (always PlantUML) on each diagram like
+            :py:meth:`to_png_base64`. Diagrams found in render cache do not
+            reach the renderer and DOT sources (see :py:meth:`render_source`)
+            are rendered by Graphviz, they are set in ``dot``.
+
+            :param list diagrams: diagrams implementing :py:meth:`to_puml`.
+            :param int processes: number of diagrams rendered concurrently.
+            :return: images as base64 encoded, in the same order.
+            :rtype: list
+        '''
+        sources = [diagram.render_source() for diagram in diagrams]
+        caches = [diagram.render_cache() for diagram in diagrams]
+        images, pending = [], []
+        for index, (diagram, (source, engine), cache) in enumerate(zip(diagrams, sources, caches)):
+            diagram.log, diagram.dot = str(), source if engine == 'dot' else None
+            diagram.uml = diagram.to_puml()
+            image = cache.get(source) if cache is not None else None
+            if image is not None:
+                diagram.log = 'cache: hit'
+            elif engine == 'dot':
+                try:
+                    image, diagram.log = render_dot(source, timeout=diagram.render_timeout())
+                    if cache is not None:
+                        cache.set(source, image)
+                except RenderError as error:
+                    _logger.warning('Graphviz rendering failed, use PlantUML: %s', error)
+                    sources[index] = diagram.uml, 'plantuml'
+            if image is None:
+                pending.append(index)
+            images.append(image)
+
+        if pending:
+            renderer = diagrams[pending[0]].renderer(processes)
+            results = renderer.render_many([sources[index][0] for index in pending])
+            for index, (image, log) in zip(pending, results):
+                images[index], diagrams[index].log = image, log
+                if caches[index] is not None:
+                    caches[index].set(sources[index][0], image)
+        return [b64encode(image) for image in images]
+
+    def renderer(self, processes=1):
+        ''' Return renderer configured for diagram environment. Backends listed in
+            ``odoo_uml.render_backends`` parameter (default "pipe,jar") are tried
+            in order: "pipe" a persistent PlantUML process, "jar" a PlantUML
+            process per diagram and "http" the PlantUML server at
+            ``odoo_uml.plantuml_server_url``.
+
+            :param int processes: number of diagrams each backend renders concurrently.
+            :rtype: FallbackRenderer
+        '''
+        env = getattr(self, '_config', {}).get('env', None)
+        names, url, timeout = 'pipe,jar', None, self.render_timeout()
+        if env is not None:
+            params = env['ir.config_parameter'].sudo()
+            names = params.get_param('odoo_uml.render_backends', names)
+            url = params.get_param('odoo_uml.plantuml_server_url')
+        backends = []
+        for name in [name.strip() for name in names.split(',')]:
+            if name == 'pipe':
+                backends.append(PipeBackend(PLANT_UML_PATH, timeout=timeout, processes=processes))
+            elif name == 'jar':
+                backends.append(
+                    JarBackend(PLANT_UML_PATH, UtilMixin.execute_cmd, timeout=timeout, processes=processes)
+                )
+            elif name == 'http' and url:
+                backends.append(HttpBackend(url, timeout=timeout, processes=processes))
+            elif name:
+                _logger.warning('Unknown or not configured render backend: %s', name)
+        return FallbackRenderer(backends)
 
 
 class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
     ''' Parse Module and generate Models Class Diagram.
     '''
+    _snapshot_models = True  #: Models, fields and methods are read, see :py:func:`get_snapshot`.
 
     def __init__(self, module, title=None, header=None, footer=None, **kwargs):
-        self._marks = []  #: Useful marks.
+        snapshot = kwargs.pop('snapshot', None)
+        if snapshot is None:
+            snapshot = get_snapshot(module.env, models=self._snapshot_models)
+        self._snapshot = snapshot   #: Metadata the diagram is generated from.
+        self._visited_modules = set()    #: Names of modules already drawn.
+        self._visited_classes = set()    #: Aliases of classes already drawn.
+        self._visited_relations = set()  #: Aliases of many2many relation tables already drawn.
+        self._read_models = set()   #: Names of models read, see :py:meth:`_read`.
+        self._read_modules = set()  #: Names of modules the models and fields read come from.
         self._dependecy_index = []  #: A ordered module list of dependencies priorities.
-        self._module = module       #: A module.
+        self._module = snapshot.modules[module.name]  #: A module.
         #: Hash dictionary when module name is key and list of models in module is a value.
         self._module_models = {}
+        #: Hash dictionary when model name is key and (module, model) list, nearest modules first, is a value.
+        self._model_index = {}
         self._config = kwargs       #: Initial config options.
         self._puml = None           #: PlantUML generated.
         UtilMixin.__init__(self)
@@ -197,25 +517,22 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
         )
 
     @staticmethod
-    def list_models(module):
-        ''' List all models in a module.
+    def _model_fields(model, ttypes=None):
+        ''' Return fields of a model.
 
-            :param ir.module.module module: modulo.
-            :return: a model list inside module.
-            :rtype: ir.model[]
+            :param ModelInfo model: model.
+            :param list ttypes: only fields of these types.
+            :rtype: list
         '''
-        models = module.env['ir.model'].sudo().search([])
-        found = []
-        for model in models:
-            if module.name in model.modules.split(', '):
-                found.append(model)
-        return found
+        if ttypes is not None:
+            return [field for field in model.fields if field.ttype in ttypes]
+        return model.fields
 
     @staticmethod
     def produce_model_name(model, **kwargs):
         ''' Produce a model name for class. Apply CamelCaseNotation at name.
 
-            :param ir.model model: model.
+            :param ModelInfo model: model.
             :param bool show_original_model_name: include name in tags using natural odoo notation.
             :param bool from_external_module: include in tags external module name.
             :return: string model name acts a class PlantUML name's.
@@ -257,39 +574,22 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
             'M' if model is regular model, or 'A' if abstract model, or 'W' for transient model (common used
             for wizards).
 
-            :param ir.model model: a model.
+            :param ModelInfo model: a model.
             :param str color_transient_model_icon: icon color if model is transient (default 'SteelBlue').
             :param str color_normal_model_icon: icon color in normal model (default 'Darkorange').
             :param str color_abstract_model_icon: icon color in abstract model (default 'Gray').
             :return: a ternary tuple with stereotype, class_icon, icon_color.
             :rtype: tuple
         '''
-        rec = ClassDiagram.record_model(model)
         class_stereotype, class_icon, icon_color = 'model', 'M', kwargs.get('color_normal_model_icon', 'Darkorange')
         if model.transient:
             class_stereotype, class_icon = 'transient', 'W'
             icon_color = kwargs.get('color_transient_model_icon', 'SteelBlue')
-        if rec._abstract:
+        if model.abstract:
             class_stereotype, class_icon = 'abstract', 'A'
             icon_color = kwargs.get('color_abstract_model_icon', 'Gray')
         return class_stereotype, class_icon, icon_color
 
-    @staticmethod
-    def record_model(model):
-        ''' Return a record for model.
-
-            :return: model.env[model.model]
-        '''
-        return model.env[model.model].sudo()
-
-    @staticmethod
-    def record_field(field):
-        ''' Return a field object form ir.model.fields
-
-            :return: ClassDiagram.record_model(field.model_id)._fields[field.name]
-        '''
-        return ClassDiagram.record_model(field.model_id)._fields[field.name]
-
     def __check_requeriments(self):
         if self._module.state == 'uninstalled':
             self.add_floating_note(
@@ -305,115 +605,85 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
 
         return self
 
-    @staticmethod
-    def _get_field_properties(field):
-        properties_name = [
-            # Common
-            'default',  # None
-            'states',   # None
-            'index',    # False
-            'size',     # None
-            'translate',  # False
-            'groups',  # None
-            'domain',  # None
-            'deprecated',  # undefinef or None
-            'inherited',  # if appear in inherits
-            # Related Attributes
-            'related',  # default None if not then store is False and copy False
-            # Compute Attributes
-            'compute',
-            'inverse',
-            'search',
-            # Company Depends
-            'company_dependent',
-            # Sparse
-            'sparse',
-            # Extra properties
-            'group_operator',
-            'readonly',
-            'store',
-            'copy',
-            'manual',
-            'required',
-            'name',
-            'args',
-            'inverse_name',  # one2many
-            'auto_join',     # one2many, many2one
-            'delegate'  # in inherits
-        ]
-        properties = dict.fromkeys(properties_name, None)
-        rec_field = ClassDiagram.record_field(field)
-        for key in properties_name:
-            properties[key] = getattr(rec_field, key, None)
-        return properties
-
     def inverse_field_many2one(self, model, field):
-        module_2o, model_2o = self._resolve(field.relation)
-        for field_2o in model_2o.field_id.filtered(lambda r: r.ttype == 'one2many'):
-            properties = ClassDiagram._get_field_properties(field_2o)
-            if properties['inverse_name'] == field.name and field_2o.relation == model.model:
-                return field_2o
-        return None
+        return self._read(self._snapshot.one2many_inverse(field.relation, model.model, field.name))
+
+    def _read(self, info):
+        ''' Record modules a model or field read by the diagram comes from, a
+            model depends on every module extending it, adding fields or
+            methods. See :py:meth:`closure`.
+
+            :param ModelInfo|FieldInfo info: a model, a field or None.
+            :return: info
+        '''
+        if isinstance(info, FieldInfo):
+            self._read_modules.update(info.modules or ())
+        elif isinstance(info, ModelInfo) and info.model not in self._read_models:
+            self._read_models.add(info.model)
+            self._read_modules.update(self._snapshot.model_modules(info.model))
+            for field in info.fields:
+                self._read_modules.update(field.modules or ())
+            self._read_modules.update(method.module for method in info.methods.values() if method.module)
+        return info
 
     def produce_attribute_features_tags(self, field, **kwargs):
         tags = []
-        properties = ClassDiagram._get_field_properties(field)
+        properties = field
         # Attribute critical features, always show.
-        if properties['required']:
+        if properties.required:
             tags.append('required')
-        if properties['readonly']:
+        if properties.readonly:
             tags.append('readonly')
 
         # If feature "show_attribute_features" enabled then include tags.
         if kwargs.get('show_attribute_features', True):
-            if properties['group_operator'] is not None and 'group_operator' in properties['args']:
-                tags.append('//group//=\'{0}\''.format(properties['group_operator']))
-            if properties['related']:
-                tags.append('//related//=\'{0}\''.format('.'.join(properties['related'])))
-                if properties['store'] and 'store' not in tags:
+            if properties.group_operator is not None:
+                tags.append('//group//=\'{0}\''.format(properties.group_operator))
+            if properties.related:
+                tags.append('//related//=\'{0}\''.format('.'.join(properties.related)))
+                if properties.store and 'store' not in tags:
                     tags.append(italic('store'))
-                if properties['copy'] and 'copy' not in tags:
+                if properties.copy and 'copy' not in tags:
                     tags.append(italic('copy'))
-            elif properties['compute'] or properties['company_dependent']:
-                if properties['compute']:
+            elif properties.compute or properties.company_dependent:
+                if properties.compute:
                     tags.append(italic('compute'))
-                if properties['company_dependent']:
+                if properties.company_dependent:
                     tags.append(italic('property'))
-                if properties['store'] and 'store' not in tags:
+                if properties.store and 'store' not in tags:
                     tags.append(italic('store'))
-                if properties['copy'] and 'copy' not in tags:
+                if properties.copy and 'copy' not in tags:
                     tags.append(italic('copy'))
-                if properties['inverse']:
+                if properties.inverse:
                     tags.append(italic('inverse'))
                 else:
                     if 'readonly' not in tags:
                         tags.append(italic('readonly'))
-                if properties['search']:
+                if properties.search:
                     tags.append(italic('search'))
 
-            if properties['groups']:
+            if properties.groups:
                 tags.append(italic('groups'))
-            if properties['states']:
+            if properties.states:
                 tags.append(italic('states'))
-            if properties['index']:
+            if properties.index:
                 tags.append(italic('index'))
-            if properties['domain']:
+            if properties.domain:
                 tags.append('domain')
-            if properties['translate']:
+            if properties.translate:
                 tags.append('translate')
-            if properties['manual']:
+            if properties.manual:
                 tags.append('manual')
-            if properties['auto_join']:
+            if properties.auto_join:
                 tags.append('autojoin')
-            if callable(properties['default']):
+            if properties.default:
                 tags.append('default')
             # TODO: Override and Overrided
         return tags
 
     def produce_attribute(self, field, **kwargs):
-        properties = ClassDiagram._get_field_properties(field)
         # No produce attribute if it is an inherits (part of delegation inheritance)
-        if properties['delegate']:
+        if field.delegate:
             return self
         tags = self.produce_attribute_features_tags(field, **kwargs)
         attr_type = bold(field.ttype.capitalize())
@@ -447,7 +717,7 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
             return self
 
         inherited_field = 0
-        for field in model.field_id:
+        for field in self._model_fields(model):
             # Exclude __las_update (concurrency check field) and display_name
             if field.name in ['__last_update', 'display_name']:
                 continue
@@ -456,7 +726,7 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
                 if field.name in ['create_date', 'write_date', 'create_uid', 'write_uid']:
                     continue
             # If feature "show_only_own_attrs" disabled all fields are included.
-            if self._module.name not in field.modules.split(', ') and kwargs.get('show_only_own_attrs', True):
+            if self._module.name not in field.modules and kwargs.get('show_only_own_attrs', True):
                 inherited_field += 1
                 continue
             self.produce_attribute(field, **kwargs)
@@ -468,56 +738,55 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
     def produce_model_features_options(self, model, **kwargs):
         ''' Produce model features in a first class section.
 
-            :param ir.model model: a model.
+            :param ModelInfo model: a model.
             :param bool show_model_config_options: enable show feature config options for model (default True).
             :return: self
             :rtype: ClassDiagram
         '''
         # Show model features options
-        rec = ClassDiagram.record_model(model)
         if kwargs.get('show_model_config_options', True):
-            if rec._inherit is not None:
-                if isinstance(rec._inherit, str):
-                    self.add_attribute('_inherit = \'{0}\''.format(rec._inherit))
-                    if model.model != rec._inherit:
+            if model.inherit is not None:
+                if isinstance(model.inherit, str):
+                    self.add_attribute('_inherit = \'{0}\''.format(model.inherit))
+                    if model.model != model.inherit:
                         self.add_attribute('_name = \'{0}\''.format(model.model))
-                if isinstance(rec._inherit, list):
-                    if model.model != rec._inherit[0]:
+                if isinstance(model.inherit, list):
+                    if model.model != model.inherit[0]:
                         self.add_attribute('_name = \'{0}\''.format(model.model))
-                    if len(rec._inherit) > 1:
+                    if len(model.inherit) > 1:
                         self.add_attribute('_inherit = [{0}]'.format(
-                            ', '.join(['\'{0}\''.format(inherit) for inherit in rec._inherit])
+                            ', '.join(['\'{0}\''.format(inherit) for inherit in model.inherit])
                         ))
                     else:
-                        self.add_attribute('_inherit = \'{0}\''.format(rec._inherit[0]))
+                        self.add_attribute('_inherit = \'{0}\''.format(model.inherit[0]))
             else:
                 self.add_attribute('_name = \'{0}\''.format(model.model))
 
-            if rec._table is not None and rec._table != model.model.replace('.', '_'):
-                self.add_attribute('_table = \'{0}\''.format(rec._table))
-            if not rec._auto:
+            if model.table is not None and model.table != model.model.replace('.', '_'):
+                self.add_attribute('_table = \'{0}\''.format(model.table))
+            if not model.auto:
                 self.add_attribute('_auto = False')
-            if rec._date_name != 'date':
-                self.add_attribute('_date_name = \'{0}\''.format(rec._date_name))
-            if rec._fold_name != 'fold':
-                self.add_attribute('_fold_name = \'{0}\''.format(rec._fold_name))
-            if rec._rec_name is not None and rec._rec_name != 'name':
-                self.add_attribute('_rec_name = \'{0}\''.format(rec._rec_name))
-            if rec._order != 'id':
-                self.add_attribute('_order = \'{0}\''.format(rec._order))
+            if model.date_name != 'date':
+                self.add_attribute('_date_name = \'{0}\''.format(model.date_name))
+            if model.fold_name != 'fold':
+                self.add_attribute('_fold_name = \'{0}\''.format(model.fold_name))
+            if model.rec_name is not None and model.rec_name != 'name':
+                self.add_attribute('_rec_name = \'{0}\''.format(model.rec_name))
+            if model.order != 'id':
+                self.add_attribute('_order = \'{0}\''.format(model.order))
             # MPTT
-            if rec._parent_name != 'parent_id':
-                self.add_attribute('_parent_name = \'{0}\''.format(rec._parent_name))
-            if rec._parent_store:
+            if model.parent_name != 'parent_id':
+                self.add_attribute('_parent_name = \'{0}\''.format(model.parent_name))
+            if model.parent_store:
                 self.add_attribute('_parent_store = True')
-            if rec._parent_order:
-                self.add_attribute('_parent_order = {0}'.format(rec._parent_order))
+            if model.parent_order:
+                self.add_attribute('_parent_order = {0}'.format(model.parent_order))
 
-            if rec._inherits:
+            if model.inherits:
                 self.add_section('..', '//inherits from//')
-                for model, field in rec._inherits.iteritems():
+                for inherit, field in model.inherits.items():
                     self.add_attribute('+ {0}:{1}'.format(
-                        field, bold(ClassDiagram.produce_model_name(model))
+                        field, bold(ClassDiagram.produce_model_name(inherit))
                     ))
 
             self.add_section('==')
@@ -526,49 +795,44 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
     def __detect_methods(self, model):
 
         module, model = self._resolve(model.model)
-        rec = ClassDiagram.record_model(model)
-
-        methods = GET_METHODS(rec, module.name)
+        members = model.methods
+        methods = sorted(name for name, method in members.items() if method.module == module.name)
         overrrides = []
-        bases = [rec._inherit] if isinstance(rec._inherit, str) else rec._inherit
-        bases_methods = []
+        bases = [model.inherit] if isinstance(model.inherit, str) else model.inherit
+        bases_methods, bases_members = [], {}
 
         if not bases:
-            if isinstance(model, models.TransientModel):
-                rec_base = models.TransientModel
-                bases_methods = BASE_TRANSIENT_METHODS
-            elif isinstance(model, models.Model):
-                rec_base = models.Model
-                bases_methods = BASE_MODEL_METHODS
-            elif isinstance(model, models.AbstractModel):
-                rec_base = models.AbstractModel
-                bases_methods = BASE_ABSTRACT_METHODS
+            if model.transient:
+                bases_methods = self._snapshot.base_methods['transient']
+            elif model.abstract:
+                bases_methods = self._snapshot.base_methods['abstract']
+            else:
+                bases_methods = self._snapshot.base_methods['model']
             bases = [False]
         for base in bases:
             if base:
                 module_base, model_base = self._resolve(base, near=model.model != base)
                 if module_base is None or model_base is None:
                     continue
-                rec_base = ClassDiagram.record_model(model_base)
-                bases_methods = GET_METHODS(rec_base, module_name=module_base.name)
+                bases_members = model_base.methods
+                bases_methods = sorted(
+                    name for name, method in bases_members.items() if method.module == module_base.name
+                )
             for method in bases_methods:
                 if method in methods:
                     # are equal?
-                    base_method = getattr(rec_base, method).__func__
-                    own_method = getattr(rec, method).__func__
-                    if base_method == own_method:
+                    base_method = bases_members.get(method)
+                    if base_method is not None and base_method.origin == members[method].origin:
                         methods.remove(method)
                     else:
                         overrrides.append(method)
-        return methods, overrrides
+        return methods, overrrides, members
 
     def produce_methods(self, model, **kwargs):
         if not kwargs.get('show_model_methods', True):
             return self
 
-        methods, overrides = self.__detect_methods(model)
-        rec = ClassDiagram.record_model(model)
-        hash_methods = {key: value for key, value in getmembers(rec)}
+        methods, overrides, hash_methods = self.__detect_methods(model)
         if methods:
             self.add_section()
         for method in methods:
@@ -579,15 +843,12 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
             else:
                 visibility = '+'
 
-            params = inspect.formatargspec(*inspect.getargspec(hash_methods[method]))[1:-1]
+            params = hash_methods[method].params
             tags = []
             if method in overrides:
                 tags.append('//override//')
-            try:
-                if hash_methods[method]._api in API_DECORATORS:
-                    tags.append(italic(hash_methods[method]._api))
-            except AttributeError:
-                pass
+            if hash_methods[method].api in API_DECORATORS:
+                tags.append(italic(hash_methods[method].api))
             self.add_method(
                 visibility=visibility,
                 name=method,
@@ -600,8 +861,8 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
 
     def ensure_external_model(self, module, model, **kwargs):
         alias_inherit = UtilMixin.produce_model_alias(module, model)
-        if alias_inherit not in self._marks:
-            self._marks.append(alias_inherit)
+        if alias_inherit not in self._visited_classes:
+            self._visited_classes.add(alias_inherit)
             self.produce_class(model, **dict(
                 kwargs,
                 from_external_module=module,
@@ -617,17 +878,15 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
 
     @staticmethod
     def __default_m2m_namerel(model, comodel):
-        model = ClassDiagram.record_model(model)
-        comodel = ClassDiagram.record_model(comodel)
-        tables = sorted([model._table, comodel._table])
+        tables = sorted([model.table, comodel.table])
         if tables[0] == tables[1]:
             _logger.error("Fail M2M default relation: %s", tables[0])
         return '%s_%s_rel' % tuple(tables)
 
     def __produce_m2m_classrel(self, **kwargs):
         alias = UtilMixin.produce_alias('{0}_{1}'.format(self._module.name, kwargs.get('relation')))
-        if alias not in self._marks:
-            self._marks.append(alias)
+        if alias not in self._visited_relations:
+            self._visited_relations.add(alias)
             self.begin_class(
                 name=ClassDiagram.produce_model_name(kwargs.get('relation')),
                 stereotype='table',
@@ -661,34 +920,29 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
         return self
 
     def produce_many2many_association(self, model, **kwargs):
-        for field in model.field_id.filtered(lambda r: r.ttype == 'many2many'):
+        for field in self._model_fields(model, ['many2many']):
             # If feature "show_only_own_attrs" disabled all fields are included.
-            if self._module.name not in field.modules.split(', ') and kwargs.get('show_only_own_attrs', True):
+            if self._module.name not in field.modules and kwargs.get('show_only_own_attrs', True):
                 continue
 
-            rec = ClassDiagram.record_model(model)
-            rec_field = ClassDiagram.record_field(field)
-            module_2m, model_2m = self._resolve(rec_field.comodel_name)
+            module_2m, model_2m = self._resolve(field.relation)
             if module_2m is None or model_2m is None:
                 _logger.warn(
                     "Extrange many2many relationship in %s, %s for %s",
-                    model.model, field.name, rec_field.comodel_name
+                    model.model, field.name, field.relation
                 )
                 return self
-            rec_m2 = ClassDiagram.record_model(model_2m)
             if module_2m.name != self._module.name:
                 self.ensure_external_model(module_2m, model_2m, **kwargs)
-            relation = rec_field.relation
-            if not relation:
-                relation = field.relation_table
+            relation = field.relation_table
             if not relation:
                 _logger.warn(
-                    "Need a default M2M relation with: %s and %s. Field relations: %s and %s",
-                    model.model, model_2m.model, rec_field.relation, field.relation_table
+                    "Need a default M2M relation with: %s and %s.",
+                    model.model, model_2m.model
                 )
                 relation = ClassDiagram.__default_m2m_namerel(model, model_2m)
-            column1 = rec_field.column1 if rec_field.column1 else '%s_id' % rec._table
-            column2 = rec_field.column2 if rec_field.column2 else '%s_id' % rec_m2._table
+            column1 = field.column1 if field.column1 else '%s_id' % model.table
+            column2 = field.column2 if field.column2 else '%s_id' % model_2m.table
             module_rel, model_rel = self._resolve(relation)
             # If defined then ensure
             if model_rel:
@@ -709,18 +963,17 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
         return self
 
     def produce_association(self, model, **kwargs):
-        for field in model.field_id.filtered(lambda r: r.ttype in ['many2one', 'one2many']):
+        for field in self._model_fields(model, ['many2one', 'one2many']):
             # Exclude log attributes
             if not kwargs.get('show_log_attributes', False):
                 if field.name in ['create_uid', 'write_uid']:
                     continue
             # If feature "show_only_own_attrs" disabled all fields are included.
-            if self._module.name not in field.modules.split(', ') and kwargs.get('show_only_own_attrs', True):
+            if self._module.name not in field.modules and kwargs.get('show_only_own_attrs', True):
                 continue
 
-            properties = ClassDiagram._get_field_properties(field)
             # No produce attribute if it is an inherits (part of delegation inheritance)
-            if properties['delegate']:
+            if field.delegate:
                 return self
 
             module_2o, model_2o = self._resolve(field.relation)
@@ -743,12 +996,11 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
                 )
 
             if field.ttype == 'one2many' and module_2o.name != self._module.name:
-                properties = ClassDiagram._get_field_properties(field)
-                inverse = properties['inverse_name']
+                inverse = field.inverse_name
                 relation = dict(
                     alias1=alias2,
                     alias2=alias1,
-                    card1='{0} *'.format(inverse.name) if inverse is not None else '*',
+                    card1='{0} *'.format(inverse) if inverse else '*',
                     card2='{0} 1'.format(field.name),
                     name='<<restrict>>' if field.on_delete == 'restrict' else None,
                     inverse=inverse
@@ -766,8 +1018,7 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
         return self
 
     def produce_inherits_relations(self, model, **kwargs):
-        rec = ClassDiagram.record_model(model)
-        for inherit, field in rec._inherits.iteritems():
+        for inherit, field in model.inherits.items():
             module_inherit, model_inherit = self._resolve(inherit)
             if model_inherit is None or module_inherit is None:
                 _logger.info("Extrange inherith(s) in %s", model.name)
@@ -781,8 +1032,7 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
             )
 
     def produce_inherit_relations(self, model, **kwargs):
-        rec = ClassDiagram.record_model(model)
-        inherit_list = rec._inherit if isinstance(rec._inherit, (list, tuple,)) else [rec._inherit]
+        inherit_list = model.inherit if isinstance(model.inherit, (list, tuple,)) else [model.inherit]
         for inherit in inherit_list:
             # two posibilities
             if model.model == inherit:
@@ -812,11 +1062,10 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
 
     def produce_class_relation(self, model, **kwargs):
         # inherit
-        rec = ClassDiagram.record_model(model)
-        if rec._inherit is not None:
+        if model.inherit is not None:
             self.produce_inherit_relations(model, **kwargs)
         # inherits
-        if rec._inherits:
+        if model.inherits:
             self.produce_inherits_relations(model, **kwargs)
         # composite & aggregate
         self.produce_association(model, **kwargs)
@@ -831,6 +1080,7 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
                 self.produce_class_relation(model, **self._config)
 
     def produce_class(self, model, **kwargs):
+        self._read(model)
         class_stereotype, class_icon, icon_color = ClassDiagram.produce_model_stereotype(model, **kwargs)
         if kwargs.get('from_external_module', None) is not None:
             module = kwargs.get('from_external_module')
@@ -866,8 +1116,8 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
     def produce_classes_from_models(self):
         for model in self._module_models[self._module.name]:
             model_alias = UtilMixin.produce_model_alias(self._module, model)
-            if model_alias not in self._marks:
-                self._marks.append(model_alias)
+            if model_alias not in self._visited_classes:
+                self._visited_classes.add(model_alias)
                 self.produce_class(model, **self._config)
 
     def to_puml(self):
@@ -880,82 +1130,99 @@ class ClassDiagram(PlantUMLClassDiagram, UtilMixin):
             self._puml = self.end_uml().output()
         return self._puml
 
+    def closure(self):
+        ''' Return names of modules the generated diagram was read from, it has
+            to be produced again when one of them is installed or upgraded.
+            Dependencies are included, and the modules extending models or
+            declaring fields read by the diagram (dependents too).
+
+            :rtype: list
+        '''
+        return sorted(set(module.name for module in self._dependecy_index) | self._read_modules)
+
     def _produce_modules_models_herarchy(self):
-        ''' Produce internal index with a WidthFirstSearch algorithm over dependecy
-            hierarchy. Create a hash of models for each module.
+        ''' Produce internal index with a breadth first walk of the dependency graph
+            (nearest dependencies first). Create a hash of models for each module
+            from the snapshot.
 
             :return: self
             :rtype: ClassDiagram
         '''
         self._dependecy_index = []
-        self._marks = []
+        self._visited_classes = set()
+        self._visited_relations = set()
+        self._read_models = set()
+        self._read_modules = set()
         self._module_models = {}
         self._alias_hash = {}
+        self._model_index = {}
 
-        stack1, stack2 = [self._module], []
-        while stack1:
-            mod = stack1.pop()
-            self._marks.append(mod.name)
+        graph = self._snapshot.graph
+        distances = {}
+        for name, distance in graph.bfs(self._module.name):
+            mod = self._snapshot.modules[name]
+            distances[name] = distance
             self._dependecy_index.append(mod)
-            self._module_models[mod.name] = ClassDiagram.list_models(mod)
-            # buil alias hash
+            self._module_models[mod.name] = self._snapshot.models_of(mod.name)
+            # buil alias hash and model candidates
             for model in self._module_models[mod.name]:
                 alias = UtilMixin.produce_alias('{0}_{1}'.format(mod.name, model.model))
                 self._alias_hash[alias] = model
-            for dependency in mod.dependencies_id:
-                dep = dependency.depend_id
-                if dep.name not in self._marks:
-                    stack2.append(dep)
-            if not stack1:
-                stack1, stack2 = stack2, []
-
-        self._marks = []
+                self._model_index.setdefault(model.model, []).append((mod, model))
+        # nearest modules first, at the same distance the one ranked last in
+        # dependency order, it sees every extension of the model made below.
+        for candidates in self._model_index.values():
+            candidates.sort(key=lambda item: (distances[item[0].name], -graph.rank(item[0].name)))
         return self
 
+    def _candidates(self, model_name, near=True):
+        ''' Return first (module, model) candidate for a model name in dependency
+            order, with near False the main module is skipped.
+
+            :rtype: tuple
+        '''
+        candidates = self._model_index.get(model_name, ())
+        if candidates and not near and candidates[0][0] == self._module:
+            candidates = candidates[1:]
+        if not candidates:
+            return None, None
+        self._read(candidates[0][1])
+        return candidates[0]
+
     def _resolve_module(self, model, near=True):
         ''' Search in dependency herarchy the first module that contains the model. If
             model not found return None.
 
-            :param ir.model|str model: a model to resolve module.
+            :param ModelInfo|str model: a model to resolve module.
             :return: module.
-            :rtype: ir.module.module
+            :rtype: ModuleInfo
         '''
         model_name = model if isinstance(model, str) else model.model
-        dependency = self._dependecy_index if near else self._dependecy_index[1:]
-        for module in dependency:
-            if model_name in [mod.model for mod in self._module_models[module.name]]:
-                return module
-
-        return self._module
+        module = self._candidates(model_name, near)[0]
+        return module if module is not None else self._module
 
     def _resolve_model(self, name, near=True):
-        dependency = self._dependecy_index if near else self._dependecy_index[1:]
-        for module in dependency:
-            for model in self._module_models[module.name]:
-                if model.model == name:
-                    return model
-
-        return None
+        return self._candidates(name, near)[1]
 
     def _resolve(self, model_name, near=True):
-        dep = self._dependecy_index if near else self._dependecy_index[1:]
-        for module in dep:
-            for model in self._module_models[module.name]:
-                if model_name == model.model:
-                    return module, model
-        return None, None
+        return self._candidates(model_name, near)
 
 
 class PackageDiagram(ClassDiagram):
-    ''' Parse module and generate Module Dependecy Diagram
+    ''' Parse module and generate Module Dependecy Diagram. With ``max_depth``
+        option only modules up to that number of hops are drawn, the others are
+        collapsed in a single "+N more" package.
     '''
+    _reverse = False  #: Dependencies are followed from dependents to dependencies.
+    _snapshot_models = False  #: Only modules and dependencies are drawn.
+
     @staticmethod
     def produce_package_name(module, **kwargs):
         ''' Produce package name from module object (ir.module.module) and some config options:
             -   show_package_status: show module install status as tag.
             -   show_descriptive_name: show human descriptive name.
 
-            :param ir.module.module module: module object
+            :param ModuleInfo module: module object
             :param bool show_package_status: (default True)
             :param bool show_descriptive_name: (default False)
             :return: package name formated
@@ -970,7 +1237,7 @@ class PackageDiagram(ClassDiagram):
 
         if kwargs.get('show_descriptive_name', False):
             tags.insert(0, 'name=%s' % module.name)
-            return u'{0}\\n{{{1}}}'.format(module.short_desc, ', '.join(tags))
+            return u'{0}\\n{{{1}}}'.format(module.shortdesc, ', '.join(tags))
 
         if tags:
             return u'{0}\\n{{{1}}}'.format(module.name, ', '.join(tags))
@@ -1013,6 +1280,9 @@ class PackageDiagram(ClassDiagram):
             footer=footer,
             **kwargs
         )
+        self._output = self  #: Package builder, PlantUML (self) or DOT.
+        self._dot = None     #: DOT generated.
+        self._distances = None  #: Hops from main module of modules in ``max_depth`` radius.
 
     def produce_package(self, module, **kwargs):
         ''' Produce a new package into diagram. Higligh main package and use some config options.
@@ -1023,14 +1293,14 @@ class PackageDiagram(ClassDiagram):
             :return: self
             :rtype: PackageDiagram
         '''
-        self._marks.append(module.name)
+        self._visited_modules.add(module.name)
         # High light main self package
         if module == self._module:
             color = kwargs.get('color_package_self', '#Yellow')
         else:
             color = kwargs.get('package_color', None)
 
-        self.begin_package(
+        self._output.begin_package(
             PackageDiagram.produce_package_name(module, **kwargs),
             stereotype=PackageDiagram.produce_package_stereotype(
                 module,
@@ -1042,17 +1312,18 @@ class PackageDiagram(ClassDiagram):
         if kwargs.get('show_main_description', False):
             self.produce_description(module)
 
-        return self.end_package()
+        self._output.end_package()
+        return self
 
     def produce_dependency(self, dependency, **kwargs):
         ''' Strategy to adquire and draw into diagram the package direct dependencies.
             Note: override to change dependency resolution estrategy.
 
-            :param ir.module.module dependency: a module dependency to draw into diagram.
+            :param ModuleInfo dependency: a module dependency to draw into diagram.
             :return: self
             :rtype: PackageDiagram
         '''
-        if dependency.name not in self._marks:
+        if dependency.name not in self._visited_modules:
             self.produce_package(dependency, **dict(
                 kwargs,
                 package_color=PackageDiagram.produce_package_color(
@@ -1060,54 +1331,134 @@ class PackageDiagram(ClassDiagram):
                 )
             ))
 
-            for sub in dependency.dependencies_id:
-                self.produce_dependency(
-                    sub.depend_id, **kwargs
-                ).add_dependency(
+            for sub in self._snapshot.depends_of(dependency.name):
+                if not self.in_radius(sub):
+                    continue
+                self.produce_dependency(sub, **kwargs)
+                self._output.add_dependency(
                     alias1=UtilMixin.produce_alias(dependency.name),
-                    alias2=UtilMixin.produce_alias(sub.depend_id.name)
+                    alias2=UtilMixin.produce_alias(sub.name)
                 )
         return self
 
+    def in_radius(self, module):
+        ''' Check if module is at most ``max_depth`` hops away from main module, all
+            modules are when ``max_depth`` is 0 or not set.
+
+            :param ModuleInfo module: a module.
+            :rtype: bool
+        '''
+        if not self._config.get('max_depth'):
+            return True
+        if self._distances is None:
+            self._distances = dict(self._snapshot.graph.bfs(
+                self._module.name, reverse=self._reverse, max_depth=self._config['max_depth']
+            ))
+        return module.name in self._distances
+
+    def produce_more(self):
+        ''' Produce a single collapsed package standing for the modules beyond
+            ``max_depth``, counted once, linked to every drawn module reaching
+            one of them.
+
+            :return: self
+            :rtype: PackageDiagram
+        '''
+        frontier = self._snapshot.graph.frontier(
+            self._module.name, reverse=self._reverse, max_depth=self._config.get('max_depth')
+        )
+        frontier = {name: hidden for name, hidden in frontier.items() if name in self._visited_modules}
+        if not frontier:
+            return self
+        alias = UtilMixin.produce_alias('{0}__more'.format(self._module.name))
+        self._output.begin_package(
+            _('+{0} more').format(len(set().union(*frontier.values()))),
+            color=self._config.get('color_more_package', '#WhiteSmoke'),
+            alias=alias
+        )
+        self._output.end_package()
+        for name in sorted(frontier):
+            aliases = [UtilMixin.produce_alias(name), alias]
+            if self._reverse:
+                aliases.reverse()
+            self._output.add_dependency(alias1=aliases[0], alias2=aliases[1])
+        return self
+
     def produce_description(self, module):
         ''' Produce floating note with summary and author package.
         '''
-        return self.add_floating_note(
+        self._output.add_floating_note(
             u'<b>Summary</b>: {0}\\n<b>Author</b>: {1}'.format(
                 module.summary,
                 module.author
             ),
             u'description_{0}'.format(
-                UtilMixin.produce_alias(self.module.name)
+                UtilMixin.produce_alias(module.name)
             )
         )
+        return self
 
     def to_puml(self):
         ''' Return a PlantUML Package Diagram as (direct) Dependency Module Diagram.
         '''
         if self._puml is None:
+            self._visited_modules = set()
             self._puml = self.begin_uml().produce_dependency(
                 self._module, **self._config
-            ).end_uml().output()
+            ).produce_more().end_uml().output()
         return self._puml
 
+    def to_dot(self):
+        ''' Return a Graphviz DOT graph with the same packages and dependencies
+            as :py:meth:`to_puml`, it is rendered without PlantUML.
+        '''
+        if self._dot is None:
+            self._visited_modules = set()
+            self._output = DotDigraph(title=self.title).begin_graph()
+            try:
+                self.produce_dependency(self._module, **self._config).produce_more()
+                self._dot = self._output.end_graph().output()
+            finally:
+                self._output = self
+        return self._dot
+
+    def closure(self):
+        ''' Override from :py:class:`odoo_uml.utils.odoo_uml.ClassDiagram`, packages
+            drawn are the modules read.
+        '''
+        return sorted(self._visited_modules)
+
+    def render_source(self):
+        ''' Package diagrams are plain graphs, render them with Graphviz unless
+            ``odoo_uml.package_renderer`` parameter is "plantuml". Default "auto"
+            uses Graphviz when "dot" command is installed.
+        '''
+        env = self._config.get('env', None)
+        engine = 'auto'
+        if env is not None:
+            engine = env['ir.config_parameter'].sudo().get_param('odoo_uml.package_renderer', engine)
+        if engine == 'dot' or (engine == 'auto' and shutil.which('dot')):
+            return self.to_dot(), 'dot'
+        return self.to_puml(), 'plantuml'
+
 
 class InvPackageDiagram(PackageDiagram):
     ''' Parse module and generate Inverse Module Dependecy Diagram.
     '''
+    _reverse = True
+
     def __init__(self, module, **kwargs):
         super(InvPackageDiagram, self).__init__(module, **kwargs)
 
     def produce_dependency(self, dependency, **kwargs):
         ''' Override from :py:class:`odoo_uml.utils.odoo_uml.PackageDiagram` to compute
-            inverse dependencies.
+            inverse dependencies, from the reverse adjacency of the dependency graph.
 
-            :param ir.module.module dependency: a module dependency to draw into diagram.
+            :param ModuleInfo dependency: a module dependency to draw into diagram.
             :return: self
             :rtype: InvPackageDiagram
         '''
-        env = dependency.env
-        if dependency.name not in self._marks:
+        if dependency.name not in self._visited_modules:
             self.produce_package(dependency, **dict(
                 kwargs,
                 package_color=PackageDiagram.produce_package_color(
@@ -1115,14 +1466,11 @@ class InvPackageDiagram(PackageDiagram):
                 )
             ))
 
-            depends_ids = env['ir.module.module'].sudo().search([
-                ('dependencies_id.name', '=', dependency.name)
-            ])
-
-            for depends in depends_ids:
-                self.produce_dependency(
-                    depends, **kwargs
-                ).add_dependency(
+            for depends in self._snapshot.dependents_of(dependency.name):
+                if not self.in_radius(depends):
+                    continue
+                self.produce_dependency(depends, **kwargs)
+                self._output.add_dependency(
                     alias1=UtilMixin.produce_alias(depends.name),
                     alias2=UtilMixin.produce_alias(dependency.name)
                 )
@@ -1,4 +1,15 @@
 # -*- coding: utf-8 -*-
+import string
+import zlib
+from base64 import b64encode
+from urllib.request import Request, urlopen
+
+#: PlantUML server text encoding alphabet, in base64 order.
+PLANTUML_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase + '-_'
+BASE64_ALPHABET = string.ascii_uppercase + string.ascii_lowercase + string.digits + '+/'
+B64_TO_PLANTUML = bytes.maketrans(BASE64_ALPHABET.encode(), PLANTUML_ALPHABET.encode())
+#: Longest URL requested with GET, servers and proxies reject longer URIs (414).
+MAX_GET_URL_LENGTH = 2000
 
 
 def bold(string):
@@ -307,3 +318,55 @@ class PlantUMLClassDiagram(StringUtil):
     def add_association_class(self, alias1, alias2, alias3, **kwargs):
         self.add_association(alias1, alias2, **kwargs)
         return self.append('({0}, {1}) .. {2}'.format(alias1, alias2, alias3)).newline()
+
+
+class PlantUML(object):
+    ''' Client of a PlantUML server (``java -jar plantuml.jar -picoweb`` or the
+        plantuml-server web application).
+    '''
+
+    def __init__(self, url, fmt='png', timeout=30):
+        self.url = url.rstrip('/')  #: Server root, ie http://localhost:8080/plantuml
+        self.fmt = fmt
+        self.timeout = timeout
+
+    @staticmethod
+    def encode(uml):
+        ''' Encode source as PlantUML server does: raw deflate and a base64
+            variant with its own alphabet and no padding.
+
+            :rtype: str
+        '''
+        compressed = zlib.compress(uml.encode('utf-8'))[2:-4]
+        encoded = b64encode(compressed).replace(b'=', b'A')
+        return encoded.translate(B64_TO_PLANTUML).decode('ascii')
+
+    def get_url(self, uml):
+        return '{0}/{1}/{2}'.format(self.url, self.fmt, PlantUML.encode(uml))
+
+    def request(self, uml):
+        ''' Build server request for a source: a GET of the encoded source
+            when its URL is short enough, otherwise a POST of the raw source.
+
+            :rtype: urllib.request.Request
+        '''
+        url = self.get_url(uml)
+        if len(url) <= MAX_GET_URL_LENGTH:
+            return Request(url)
+        return Request(
+            '{0}/{1}'.format(self.url, self.fmt),
+            data=uml.encode('utf-8'),
+            headers={'Content-Type': 'text/plain; charset=utf-8'}
+        )
+
+    def processes(self, uml):
+        ''' Render source in server.
+
+            :return: image content.
+            :rtype: bytes
+        '''
+        response = urlopen(self.request(uml), timeout=self.timeout)
+        try:
+            return response.read()
+        finally:
+            response.close()
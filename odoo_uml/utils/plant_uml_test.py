@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 import unittest
+import zlib
+from base64 import b64decode
 
 from plant_uml import *
 
@@ -330,5 +332,38 @@ class TestPlantUMLClassDiagram(unittest.TestCase):
         )
 
 
+class TestPlantUML(unittest.TestCase):
+    def decode(self, encoded):
+        data = encoded.encode('ascii').translate(
+            bytes.maketrans(PLANTUML_ALPHABET.encode(), BASE64_ALPHABET.encode())
+        )
+        return zlib.decompress(b64decode(data), -15).decode('utf-8')
+
+    def test_encode(self):
+        for uml in ['', 'A', 'Bob -> Alice : hello', '@startuml\nclass "Módulo"\n@enduml']:
+            encoded = PlantUML.encode(uml)
+            self.assertTrue(set(encoded) <= set(PLANTUML_ALPHABET))
+            self.assertEqual(self.decode(encoded), uml)
+
+    def test_encode_reference(self):
+        # Example from PlantUML text encoding documentation.
+        self.assertEqual(PlantUML.encode('Bob -> Alice : hello'), 'SyfFKj2rKt3CoKnELR1Io4ZDoSa70000')
+
+    def test_get_url(self):
+        self.assertEqual(
+            PlantUML('http://localhost:8080/plantuml/', fmt='svg').get_url('A'),
+            'http://localhost:8080/plantuml/svg/%s' % PlantUML.encode('A')
+        )
+
+    def test_request(self):
+        client = PlantUML('http://localhost:8080/plantuml')
+        short = client.request('A')
+        self.assertEqual((short.get_method(), short.full_url), ('GET', client.get_url('A')))
+        uml = '@startuml\n%s\n@enduml' % '\n'.join('class C%d' % i for i in range(2000))
+        long = client.request(uml)
+        self.assertEqual((long.get_method(), long.full_url), ('POST', 'http://localhost:8080/plantuml/png'))
+        self.assertEqual(long.data, uml.encode('utf-8'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+import os
+import atexit
+import logging
+import select
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from subprocess import Popen, PIPE, TimeoutExpired
+from time import time
+
+try:
+    from .plant_uml import PlantUML
+except (ImportError, ValueError):
+    from plant_uml import PlantUML
+
+_logger = logging.getLogger(__name__)
+
+#: Marker printed by PlantUML after each image in pipe mode.
+PIPE_DELIMITER = '__odoo_uml_end_of_diagram__'
+
+
+class RenderError(Exception):
+    ''' Raised when a diagram can not be rendered.
+    '''
+
+
+class PlantUMLPipe(object):
+    ''' Long-lived PlantUML process driven over stdin/stdout with "-pipe" mode.
+
+        The JVM is started lazily on the first render, reused for every
+        following diagram and restarted when it dies. All diagrams rendered
+        through one instance are serialized by a lock.
+    '''
+
+    def __init__(self, cmd, delimiter=PIPE_DELIMITER, timeout=60):
+        self.cmd = list(cmd)        #: Command line, must include "-pipe".
+        self.delimiter = delimiter  #: Delimiter printed after each image.
+        self.timeout = timeout      #: Seconds to wait for a single diagram.
+        self._process = None
+        self._pid = None            #: Owner pid, detect forked workers.
+        self._lock = threading.Lock()
+        self._stderr = deque(maxlen=50)
+
+    @property
+    def alive(self):
+        return (
+            self._process is not None and
+            self._pid == os.getpid() and
+            self._process.poll() is None
+        )
+
+    def start(self):
+        ''' Start renderer process if it is not running.
+
+            :return: self
+            :rtype: PlantUMLPipe
+        '''
+        if self._process is not None and self._pid != os.getpid():
+            # Process was inherited from parent on fork, leave it alone.
+            self._process = None
+        if self.alive:
+            return self
+        self.stop()
+        _logger.info('Start PlantUML renderer: %s.', ' '.join(self.cmd))
+        try:
+            self._process = Popen(self.cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=0)
+        except OSError as error:
+            raise RenderError('Unable to start PlantUML renderer: %s' % error)
+        self._pid = os.getpid()
+        self._stderr.clear()
+        reader = threading.Thread(
+            target=self._drain_stderr,
+            args=(self._process.stderr,),
+            name='odoo_uml.render.stderr'
+        )
+        reader.daemon = True
+        reader.start()
+        return self
+
+    def stop(self):
+        ''' Close renderer stdin and wait for it, kill it if it does not finish.
+        '''
+        process, self._process = self._process, None
+        if process is None or self._pid != os.getpid():
+            return self
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except Exception:
+            process.kill()
+            process.wait()
+        _logger.info('PlantUML renderer stopped.')
+        return self
+
+    def _drain_stderr(self, stream):
+        for line in iter(stream.readline, b''):
+            line = line.decode('utf-8', 'replace').rstrip()
+            self._stderr.append(line)
+            _logger.debug(line)
+
+    def _read_image(self):
+        end = self.delimiter.encode('utf-8')
+        fd = self._process.stdout.fileno()
+        deadline = time() + self.timeout
+        chunks = bytearray()
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise RenderError('PlantUML renderer timeout after %ss.' % self.timeout)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError('PlantUML renderer died: %s' % '\n'.join(self._stderr))
+            chunks.extend(chunk)
+            # Only the tail is checked, copying the whole image on each chunk
+            # is quadratic in its size.
+            tail = bytes(chunks[-(len(end) + 2):])
+            data = tail.rstrip(b'\r\n')
+            if data.endswith(end):
+                return bytes(chunks[:len(chunks) - (len(tail) - len(data)) - len(end)])
+
+    def _render(self, uml):
+        self.start()
+        try:
+            self._process.stdin.write(uml.encode('utf-8') + b'\n')
+            self._process.stdin.flush()
+            return self._read_image()
+        except (OSError, EOFError, RenderError):
+            # Leave the process in a clean state for next render.
+            if self._process is not None:
+                self._process.kill()
+                self._process.wait()
+                self._process = None
+            raise
+
+    def render(self, uml):
+        ''' Render a PlantUML source.
+
+            :param str uml: a full PlantUML source (@startuml...@enduml).
+            :return: image content.
+            :rtype: bytes
+        '''
+        return self.render_many([uml])[0]
+
+    def render_many(self, umls, timings=None):
+        ''' Render several PlantUML sources in one renderer call, the lock is
+            taken once so diagrams of a batch are never interleaved with others.
+
+            :param list umls: PlantUML sources.
+            :param list timings: if given, seconds spent on each diagram are appended.
+            :return: images content in the same order.
+            :rtype: list
+        '''
+        images = []
+        with self._lock:
+            for uml in umls:
+                start = time()
+                try:
+                    images.append(self._render(uml))
+                except (OSError, EOFError):
+                    # Renderer died, restart it once.
+                    _logger.warning('PlantUML renderer died, restarting it.')
+                    try:
+                        images.append(self._render(uml))
+                    except (OSError, EOFError) as error:
+                        raise RenderError('PlantUML renderer failed: %s' % error)
+                if timings is not None:
+                    timings.append(time() - start)
+        return images
+
+
+class PlantUMLPool(object):
+    ''' Pool of :py:class:`PlantUMLPipe` processes rendering diagrams in
+        parallel, for bulk rendering. Each renderer process is driven by one
+        thread, so throughput scales with the number of cores.
+    '''
+
+    def __init__(self, cmd, size=None, timeout=60):
+        size = size or os.cpu_count() or 1
+        self._cmd = cmd
+        self._pipes = Queue()
+        self._all = [PlantUMLPipe(cmd, timeout=timeout) for _ in range(size)]
+        for pipe in self._all:
+            self._pipes.put(pipe)
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        self._lock = threading.Lock()  #: Guards executor replacement on resize.
+
+    @property
+    def size(self):
+        ''' Number of renderer processes.
+        '''
+        return len(self._all)
+
+    def resize(self, size):
+        ''' Change the number of renderer processes. Processes removed are
+            stopped once their current diagram is rendered, queued diagrams
+            are still rendered.
+
+            :param int size: new number of renderer processes.
+            :return: self
+            :rtype: PlantUMLPool
+        '''
+        size = max(1, size)
+        with self._lock:
+            if size == len(self._all):
+                return self
+            while len(self._all) < size:
+                pipe = PlantUMLPipe(self._cmd, timeout=self.timeout)
+                self._all.append(pipe)
+                self._pipes.put(pipe)
+            executor, self._executor = self._executor, ThreadPoolExecutor(max_workers=size)
+        executor.shutdown(wait=True)
+        with self._lock:
+            while len(self._all) > size:
+                pipe = self._pipes.get()
+                self._all.remove(pipe)
+                pipe.stop()
+        return self
+
+    @property
+    def timeout(self):
+        ''' Seconds to wait for a single diagram, in every process.
+        '''
+        return self._all[0].timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        for pipe in self._all:
+            pipe.timeout = timeout
+
+    def _render(self, uml):
+        pipe = self._pipes.get()
+        try:
+            return pipe.render(uml)
+        finally:
+            self._pipes.put(pipe)
+
+    def _timed_render(self, uml):
+        start = time()
+        return self._render(uml), time() - start
+
+    def submit(self, uml):
+        ''' Queue a diagram for rendering.
+
+            :param str uml: a full PlantUML source.
+            :return: a future with image content as result.
+            :rtype: concurrent.futures.Future
+        '''
+        with self._lock:
+            return self._executor.submit(self._render, uml)
+
+    def render_many(self, umls, timings=None):
+        ''' Render several PlantUML sources across the pool and wait for them.
+
+            :param list umls: PlantUML sources.
+            :param list timings: if given, seconds spent on each diagram are appended.
+            :return: images content in the same order.
+            :rtype: list
+        '''
+        with self._lock:
+            futures = [self._executor.submit(self._timed_render, uml) for uml in umls]
+        results = [future.result() for future in futures]
+        if timings is not None:
+            timings.extend(elapsed for _image, elapsed in results)
+        return [image for image, _elapsed in results]
+
+    def stop(self):
+        ''' Wait for queued diagrams and stop every renderer process.
+        '''
+        self._executor.shutdown(wait=True)
+        for pipe in self._all:
+            pipe.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def pipe_command(jar_path, fmt='png'):
+    ''' Command line of a PlantUML pipe renderer.
+
+        :param str jar_path: path to plantuml.jar.
+        :param str fmt: output format (png, svg, ...).
+        :rtype: list
+    '''
+    return [
+        'java', '-Djava.awt.headless=true', '-jar', jar_path,
+        '-charset', 'UTF-8', '-t%s' % fmt,
+        '-pipe', '-pipedelimitor', PIPE_DELIMITER
+    ]
+
+
+_PIPES = {}
+_PIPES_LOCK = threading.Lock()
+
+
+def get_pipe(jar_path, fmt='png'):
+    ''' Return the shared pipe renderer for a jar and output format.
+
+        :param str jar_path: path to plantuml.jar.
+        :param str fmt: output format (png, svg, ...).
+        :rtype: PlantUMLPipe
+    '''
+    key = (jar_path, fmt)
+    with _PIPES_LOCK:
+        if key not in _PIPES:
+            _PIPES[key] = PlantUMLPipe(pipe_command(jar_path, fmt))
+        return _PIPES[key]
+
+
+_POOLS = {}
+
+
+def get_pool(jar_path, size, fmt='png'):
+    ''' Return the shared pool of pipe renderers for a jar and output format,
+        resized to the number of processes. A single pool is kept by worker,
+        so exports with different numbers of processes do not leave idle
+        renderer processes behind.
+
+        :param str jar_path: path to plantuml.jar.
+        :param int size: number of renderer processes.
+        :param str fmt: output format (png, svg, ...).
+        :rtype: PlantUMLPool
+    '''
+    key = (jar_path, fmt)
+    with _PIPES_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = PlantUMLPool(pipe_command(jar_path, fmt), size)
+        pool = _POOLS[key]
+    return pool.resize(size)
+
+
+def render_parallel(render, umls, processes=1):
+    ''' Call render on each source with up to processes threads.
+
+        :param callable render: render a single source.
+        :param list umls: sources.
+        :param int processes: number of concurrent renders.
+        :return: render results in the same order.
+        :rtype: list
+    '''
+    if processes <= 1 or len(umls) <= 1:
+        return [render(uml) for uml in umls]
+    with ThreadPoolExecutor(max_workers=min(processes, len(umls))) as executor:
+        return list(executor.map(render, umls))
+
+
+class CommandResult(namedtuple('CommandResult', 'args returncode stdout stderr elapsed timed_out')):
+    ''' Outcome of :py:func:`run_command`, output streams are bytes.
+    '''
+    __slots__ = ()
+
+    def to_log(self):
+        ''' Describe command run for diagram logs.
+
+            :rtype: str
+        '''
+        lines = [
+            'command: %s' % ' '.join(self.args),
+            'returncode: %s%s' % (self.returncode, ' (killed on timeout)' if self.timed_out else ''),
+            'elapsed: %.3fs' % self.elapsed,
+        ]
+        if self.stderr:
+            lines.append('stderr:\n%s' % self.stderr.decode('utf-8', 'replace').strip())
+        return '\n'.join(lines)
+
+
+def run_command(args, input=None, timeout=None):
+    ''' Run a command feeding its stdin and collecting stdout and stderr
+        concurrently, so a verbose process never blocks on a full pipe. The
+        process is killed when it runs longer than timeout.
+
+        :param list args: command line.
+        :param bytes input: data sent to standard input.
+        :param float timeout: wall-clock limit in seconds, None waits forever.
+        :rtype: CommandResult
+    '''
+    start = time()
+    process = Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    timed_out = False
+    try:
+        stdout, stderr = process.communicate(input, timeout=timeout)
+    except TimeoutExpired:
+        process.kill()
+        stdout, stderr = process.communicate()
+        timed_out = True
+    return CommandResult(list(args), process.returncode, stdout, stderr, time() - start, timed_out)
+
+
+def format_log(backend, elapsed, detail=None):
+    ''' Produce render log of a diagram.
+
+        :rtype: str
+    '''
+    lines = ['backend: %s' % backend, 'elapsed: %.3fs' % elapsed]
+    if detail:
+        lines.append(detail)
+    return '\n'.join(lines)
+
+
+class PipeBackend(object):
+    ''' Render through the shared persistent :py:class:`PlantUMLPipe` of a jar,
+        or the shared :py:class:`PlantUMLPool` when several processes are used.
+    '''
+    name = 'pipe'
+
+    def __init__(self, jar_path, timeout=60, processes=1):
+        self.jar_path = jar_path
+        self.timeout = timeout
+        self.processes = processes
+
+    def render_many(self, umls):
+        ''' Render sources.
+
+            :return: (image, log) pairs in the same order.
+            :rtype: list
+        '''
+        if self.processes > 1 and len(umls) > 1:
+            renderer = get_pool(self.jar_path, self.processes)
+        else:
+            renderer = get_pipe(self.jar_path)
+        renderer.timeout = self.timeout
+        timings = []
+        images = renderer.render_many(umls, timings=timings)
+        return [(image, format_log(self.name, elapsed)) for image, elapsed in zip(images, timings)]
+
+
+class JarBackend(object):
+    ''' Render each diagram with a new "java -jar plantuml.jar -pipe" process,
+        source is streamed to its stdin and image read from its stdout.
+    '''
+    name = 'jar'
+
+    def __init__(self, jar_path, execute, timeout=60, processes=1):
+        self.jar_path = jar_path
+        self.execute = execute  #: Command runner, return a CommandResult.
+        self.timeout = timeout
+        self.processes = processes
+
+    def _render(self, uml):
+        try:
+            result = self.execute(
+                'java', '-Djava.awt.headless=true', '-jar', self.jar_path,
+                '-charset', 'UTF-8', '-tpng', '-pipe',
+                input=uml.encode('utf-8'),
+                timeout=self.timeout
+            )
+        except OSError as error:
+            raise RenderError('PlantUML jar failed: %s' % error)
+        if result.timed_out:
+            raise RenderError('PlantUML jar killed after %ss.' % self.timeout)
+        if not result.stdout:
+            raise RenderError('PlantUML jar produced no image.\n%s' % result.to_log())
+        return result.stdout, format_log(self.name, result.elapsed, result.to_log())
+
+    def render_many(self, umls):
+        return render_parallel(self._render, umls, self.processes)
+
+
+class HttpBackend(object):
+    ''' Render in a PlantUML server with :py:class:`PlantUML` client.
+    '''
+    name = 'http'
+
+    def __init__(self, url, timeout=30, processes=1):
+        self.client = PlantUML(url, timeout=timeout)
+        self.processes = processes
+
+    def _render(self, uml):
+        start = time()
+        try:
+            image = self.client.processes(uml)
+        except Exception as error:
+            raise RenderError('PlantUML server %s failed: %s' % (self.client.url, error))
+        return image, format_log(self.name, time() - start, 'server: %s' % self.client.url)
+
+    def render_many(self, umls):
+        return render_parallel(self._render, umls, self.processes)
+
+
+class FallbackRenderer(object):
+    ''' Render with first backend able to do it.
+    '''
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def render_many(self, umls):
+        ''' Render sources with backends in order, all diagrams of a call are
+            rendered by the same backend.
+
+            :return: (image, log) pairs in the same order.
+            :rtype: list
+        '''
+        if not umls:
+            return []
+        errors = []
+        for backend in self.backends:
+            try:
+                return backend.render_many(umls)
+            except RenderError as error:
+                _logger.warning('Render backend %s failed: %s', backend.name, error)
+                errors.append('%s: %s' % (backend.name, error))
+        raise RenderError('No render backend available. %s' % '; '.join(errors))
+
+
+def render_dot(source, fmt='png', timeout=60):
+    ''' Render a Graphviz DOT source with the "dot" command.
+
+        :param str source: DOT source.
+        :param str fmt: output format (png, svg, ...).
+        :return: image content and render log.
+        :rtype: tuple
+    '''
+    try:
+        result = run_command(['dot', '-T%s' % fmt], input=source.encode('utf-8'), timeout=timeout)
+    except OSError as error:
+        raise RenderError('Unable to run Graphviz dot: %s' % error)
+    if result.timed_out:
+        raise RenderError('Graphviz dot killed after %ss.' % timeout)
+    if result.returncode:
+        raise RenderError('Graphviz dot failed.\n%s' % result.to_log())
+    return result.stdout, format_log('dot', result.elapsed, result.to_log())
+
+
+@atexit.register
+def shutdown_pipes():
+    ''' Stop every shared renderer, called when Odoo worker exits.
+    '''
+    with _PIPES_LOCK:
+        for pipe in _PIPES.values():
+            pipe.stop()
+        for pool in _POOLS.values():
+            pool.stop()
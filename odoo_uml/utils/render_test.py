@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import shutil
+import sys
+import unittest
+
+from render import (
+    FallbackRenderer, PlantUMLPipe, PlantUMLPool, RenderError, PIPE_DELIMITER,
+    render_dot, render_parallel, run_command
+)
+
+# Minimal stand-in for "plantuml -pipe": echo each diagram back as its image.
+FAKE_PIPE = '''
+import sys
+count = 0
+lines = []
+for line in iter(sys.stdin.buffer.readline, b''):
+    lines.append(line)
+    if line.startswith(b'@enduml'):
+        count += 1
+        sys.stdout.buffer.write(b''.join(lines).strip())
+        sys.stdout.buffer.write(b'\\n%s\\n' % sys.argv[1].encode())
+        sys.stdout.buffer.flush()
+        lines = []
+        if count >= int(sys.argv[2]):
+            sys.exit(0)
+'''
+
+
+def fake_pipe(die_after=1000, timeout=10):
+    return PlantUMLPipe(
+        [sys.executable, '-c', FAKE_PIPE, PIPE_DELIMITER, str(die_after)],
+        timeout=timeout
+    )
+
+
+class TestPlantUMLPipe(unittest.TestCase):
+    def test_lazy_start(self):
+        pipe = fake_pipe()
+        self.assertFalse(pipe.alive)
+        pipe.render('@startuml\n@enduml')
+        self.assertTrue(pipe.alive)
+        pipe.stop()
+        self.assertFalse(pipe.alive)
+
+    def test_render(self):
+        pipe = fake_pipe()
+        self.assertEqual(pipe.render('@startuml\nA ..> B\n@enduml'), b'@startuml\nA ..> B\n@enduml\n')
+        self.assertEqual(pipe.render('@startuml\nB ..> C\n@enduml'), b'@startuml\nB ..> C\n@enduml\n')
+        pipe.stop()
+
+    def test_render_large(self):
+        pipe = fake_pipe()
+        body = '\n'.join('A%s ..> B' % index for index in range(50000))
+        uml = '@startuml\n%s\n@enduml' % body
+        self.assertEqual(pipe.render(uml), uml.encode('utf-8') + b'\n')
+        pipe.stop()
+
+    def test_render_many(self):
+        pipe = fake_pipe()
+        self.assertEqual(
+            pipe.render_many(['@startuml\nA\n@enduml', '@startuml\nB\n@enduml', '@startuml\nC\n@enduml']),
+            [b'@startuml\nA\n@enduml\n', b'@startuml\nB\n@enduml\n', b'@startuml\nC\n@enduml\n']
+        )
+        self.assertEqual(pipe.render_many([]), [])
+        timings = []
+        pipe.render_many(['@startuml\nA\n@enduml', '@startuml\nB\n@enduml'], timings=timings)
+        self.assertEqual(len(timings), 2)
+        pipe.stop()
+
+    def test_reuse_process(self):
+        pipe = fake_pipe()
+        pipe.render('@startuml\n@enduml')
+        process = pipe._process
+        pipe.render('@startuml\n@enduml')
+        self.assertIs(pipe._process, process)
+        pipe.stop()
+
+    def test_restart(self):
+        pipe = fake_pipe(die_after=1)
+        for _ in range(3):
+            self.assertEqual(pipe.render('@startuml\n@enduml'), b'@startuml\n@enduml\n')
+        pipe.stop()
+
+    def test_start_failure(self):
+        pipe = PlantUMLPipe(['/nonexistent/plantuml'])
+        self.assertRaises(RenderError, pipe.render, '@startuml\n@enduml')
+
+    def test_timeout(self):
+        pipe = fake_pipe(timeout=0.5)
+        # Without @enduml the renderer never answers.
+        self.assertRaises(RenderError, pipe.render, '@startuml')
+        self.assertFalse(pipe.alive)
+
+
+class TestPlantUMLPool(unittest.TestCase):
+    def test_submit(self):
+        cmd = [sys.executable, '-c', FAKE_PIPE, PIPE_DELIMITER, '1000']
+        with PlantUMLPool(cmd, size=3) as pool:
+            futures = [pool.submit('@startuml\n%s\n@enduml' % i) for i in range(10)]
+            self.assertEqual(
+                [future.result() for future in futures],
+                [b'@startuml\n%d\n@enduml\n' % i for i in range(10)]
+            )
+            self.assertLessEqual(len([pipe for pipe in pool._all if pipe.alive]), 3)
+
+    def test_render_many(self):
+        cmd = [sys.executable, '-c', FAKE_PIPE, PIPE_DELIMITER, '1000']
+        with PlantUMLPool(cmd, size=2, timeout=10) as pool:
+            timings = []
+            self.assertEqual(
+                pool.render_many(['@startuml\n%s\n@enduml' % i for i in range(4)], timings=timings),
+                [b'@startuml\n%d\n@enduml\n' % i for i in range(4)]
+            )
+            self.assertEqual(len(timings), 4)
+            pool.timeout = 5
+            self.assertEqual(pool.timeout, 5)
+
+    def test_resize(self):
+        cmd = [sys.executable, '-c', FAKE_PIPE, PIPE_DELIMITER, '1000']
+        umls = ['@startuml\n%s\n@enduml' % i for i in range(6)]
+        images = [b'@startuml\n%d\n@enduml\n' % i for i in range(6)]
+        with PlantUMLPool(cmd, size=2, timeout=10) as pool:
+            self.assertEqual(pool.render_many(umls), images)
+            self.assertEqual(pool.resize(4).size, 4)
+            self.assertEqual(pool.render_many(umls), images)
+            removed = list(pool._all)
+            self.assertEqual(pool.resize(1).size, 1)
+            self.assertEqual(len([pipe for pipe in removed if pipe.alive]), 1)
+            self.assertEqual(pool.render_many(umls), images)
+            self.assertEqual(pool.timeout, 10)
+
+    def test_error(self):
+        with PlantUMLPool(['/nonexistent/plantuml'], size=2) as pool:
+            future = pool.submit('@startuml\n@enduml')
+            self.assertRaises(RenderError, future.result)
+
+
+class TestRenderParallel(unittest.TestCase):
+    def test_order(self):
+        self.assertEqual(render_parallel(str.upper, ['a', 'b', 'c'], processes=2), ['A', 'B', 'C'])
+        self.assertEqual(render_parallel(str.upper, ['a'], processes=1), ['A'])
+
+    def test_error(self):
+        def render(uml):
+            raise RenderError(uml)
+        self.assertRaises(RenderError, render_parallel, render, ['a', 'b'], processes=2)
+
+
+class TestRunCommand(unittest.TestCase):
+    def test_output(self):
+        result = run_command([sys.executable, '-c', 'import sys; sys.stdout.write(sys.stdin.read().upper())'], input=b'abc')
+        self.assertEqual((result.returncode, result.stdout, result.timed_out), (0, b'ABC', False))
+        self.assertIn('returncode: 0', result.to_log())
+
+    def test_verbose_stderr(self):
+        # Far more than a pipe buffer on stderr must not block the command.
+        result = run_command(
+            [sys.executable, '-c', 'import sys; sys.stderr.write("x" * 1000000); print("done")'],
+            timeout=20
+        )
+        self.assertEqual((result.stdout.strip(), len(result.stderr)), (b'done', 1000000))
+
+    def test_timeout(self):
+        result = run_command([sys.executable, '-c', 'import time; time.sleep(30)'], timeout=0.5)
+        self.assertTrue(result.timed_out)
+        self.assertLess(result.elapsed, 10)
+        self.assertIn('killed on timeout', result.to_log())
+
+
+class Backend(object):
+    def __init__(self, name, fail=False):
+        self.name, self.fail, self.calls = name, fail, 0
+
+    def render_many(self, umls):
+        self.calls += 1
+        if self.fail:
+            raise RenderError('%s is down' % self.name)
+        return [(('%s:%s' % (self.name, uml)).encode(), self.name) for uml in umls]
+
+
+class TestFallbackRenderer(unittest.TestCase):
+    def test_first_backend(self):
+        first, second = Backend('first'), Backend('second')
+        renderer = FallbackRenderer([first, second])
+        self.assertEqual(renderer.render_many(['A', 'B']), [(b'first:A', 'first'), (b'first:B', 'first')])
+        self.assertEqual(second.calls, 0)
+
+    def test_fallback(self):
+        renderer = FallbackRenderer([Backend('first', fail=True), Backend('second')])
+        self.assertEqual(renderer.render_many(['A']), [(b'second:A', 'second')])
+
+    def test_all_fail(self):
+        renderer = FallbackRenderer([Backend('first', fail=True), Backend('second', fail=True)])
+        self.assertRaises(RenderError, renderer.render_many, ['A'])
+
+    def test_empty(self):
+        first = Backend('first')
+        self.assertEqual(FallbackRenderer([first]).render_many([]), [])
+        self.assertEqual(first.calls, 0)
+
+
+@unittest.skipUnless(shutil.which('dot'), 'Graphviz dot not installed')
+class TestRenderDot(unittest.TestCase):
+    def test_render(self):
+        image, log = render_dot('digraph G { a -> b; }', fmt='png')
+        self.assertTrue(image.startswith(b'\x89PNG'))
+        self.assertIn('backend: dot', log)
+
+    def test_error(self):
+        self.assertRaises(RenderError, render_dot, 'digraph G { a -> ')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+''' Plain Python metadata diagrams are generated from. A snapshot is extracted
+    once from the database and the registry, then diagrams do not need a cursor.
+'''
+import os
+import json
+import logging
+from tempfile import NamedTemporaryFile
+
+try:
+    from .depgraph import DependencyGraph
+except (ImportError, ValueError):
+    from depgraph import DependencyGraph
+
+_logger = logging.getLogger(__name__)
+
+#: Version of the snapshot file format, files of other versions are ignored.
+SNAPSHOT_FORMAT = 1
+
+
+class Info(object):
+    ''' Base of snapshot records, attributes are listed in ``__slots__`` and
+        missing ones default to None.
+    '''
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            setattr(self, key, kwargs.get(key, None))
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(type(self).__name__, getattr(self, self.__slots__[0]))
+
+    def pack(self):
+        ''' Return attribute values in ``__slots__`` order.
+
+            :rtype: list
+        '''
+        return [getattr(self, key) for key in self.__slots__]
+
+    @classmethod
+    def unpack(cls, values):
+        ''' Build a record from :py:meth:`pack` values.
+        '''
+        return cls(**dict(zip(cls.__slots__, values)))
+
+
+class ModuleInfo(Info):
+    ''' A module (ir.module.module), ``depends`` are module names.
+    '''
+    __slots__ = (
+        'name', 'state', 'latest_version', 'application', 'auto_install',
+        'summary', 'shortdesc', 'author', 'depends'
+    )
+
+
+class ModelInfo(Info):
+    ''' A model (ir.model) with its class options (``_inherit``, ``_table``, ...
+        without underscore), ``fields`` list and ``methods`` by name.
+    '''
+    __slots__ = (
+        'model', 'name', 'transient', 'abstract', 'inherit', 'inherits', 'table',
+        'auto', 'date_name', 'fold_name', 'rec_name', 'order', 'parent_name',
+        'parent_store', 'parent_order', 'fields', 'methods'
+    )
+
+    def pack(self):
+        values = super(ModelInfo, self).pack()
+        values[-2] = [field.pack() for field in self.fields]
+        values[-1] = [method.pack() for _name, method in sorted(self.methods.items())]
+        return values
+
+    @classmethod
+    def unpack(cls, values):
+        info = super(ModelInfo, cls).unpack(values)
+        info.fields = [FieldInfo.unpack(field) for field in info.fields]
+        info.methods = {method[0]: MethodInfo.unpack(method) for method in info.methods}
+        return info
+
+
+class FieldInfo(Info):
+    ''' A field (ir.model.fields) with the field object properties drawn in
+        diagrams. ``relation`` is the comodel, ``relation_table`` the many2many
+        table, ``modules`` the installed modules declaring the field and
+        ``default`` is True for a computed default.
+    '''
+    __slots__ = (
+        'name', 'model', 'ttype', 'relation', 'relation_table', 'column1', 'column2',
+        'size', 'on_delete', 'modules',
+        'default', 'states', 'index', 'translate', 'groups', 'domain', 'related',
+        'compute', 'inverse', 'search', 'company_dependent', 'group_operator',
+        'readonly', 'store', 'copy', 'manual', 'required', 'inverse_name',
+        'auto_join', 'delegate'
+    )
+
+
+class MethodInfo(Info):
+    ''' A model method: ``params`` as written in the signature, ``api`` decorator,
+        ``module`` the addon defining it and ``origin`` the function qualified name,
+        equal origins mean the same function.
+    '''
+    __slots__ = ('name', 'params', 'api', 'module', 'origin')
+
+
+class MetadataSnapshot(object):
+    ''' Modules, models, fields and methods of a database.
+
+        :param dict modules: :py:class:`ModuleInfo` by name.
+        :param dict models: :py:class:`ModelInfo` by model name.
+        :param dict module_models: model names (sorted) declared or extended by
+            each module.
+        :param dict base_methods: method names of base classes by kind ("model",
+            "transient" and "abstract").
+        :param str signature: state the snapshot was taken from.
+    '''
+
+    def __init__(self, modules, models, module_models, base_methods, signature=None):
+        self.modules = modules
+        self.models = models
+        self.module_models = module_models
+        self.base_methods = base_methods
+        self.signature = signature
+        self._one2many = None
+        self._graph = None
+        self._model_modules = None
+
+    def dump(self, file_path):
+        ''' Write snapshot as JSON, the file is written aside and renamed so
+            readers never see a partial file.
+
+            :param str file_path: file path.
+        '''
+        data = {
+            'format': SNAPSHOT_FORMAT,
+            'signature': self.signature,
+            'modules': [module.pack() for _name, module in sorted(self.modules.items())],
+            'models': [model.pack() for _name, model in sorted(self.models.items())],
+            'module_models': self.module_models,
+            'base_methods': self.base_methods,
+        }
+        directory = os.path.dirname(file_path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f_out:
+            json.dump(data, f_out, separators=(',', ':'))
+        os.rename(f_out.name, file_path)
+
+    @staticmethod
+    def load(file_path, signature=None):
+        ''' Read a snapshot written by :py:meth:`dump`.
+
+            :param str file_path: file path.
+            :param str signature: expected signature, if given.
+            :return: snapshot or None if file is missing, unreadable or stale.
+            :rtype: MetadataSnapshot
+        '''
+        try:
+            with open(file_path) as f_in:
+                data = json.load(f_in)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('format') != SNAPSHOT_FORMAT or (signature is not None and data.get('signature') != signature):
+            return None
+        try:
+            return MetadataSnapshot(
+                {values[0]: ModuleInfo.unpack(values) for values in data['modules']},
+                {values[0]: ModelInfo.unpack(values) for values in data['models']},
+                data['module_models'],
+                data['base_methods'],
+                signature=data['signature']
+            )
+        except (KeyError, IndexError, TypeError) as error:
+            _logger.warning('Ignore corrupted metadata snapshot %s: %s', file_path, error)
+            return None
+
+    def models_of(self, module_name):
+        ''' Models declared or extended by a module.
+
+            :rtype: list
+        '''
+        return [self.models[name] for name in self.module_models.get(module_name, ()) if name in self.models]
+
+    def model_modules(self, model_name):
+        ''' Modules declaring or extending a model, sorted by name.
+
+            :rtype: list
+        '''
+        if self._model_modules is None:
+            self._model_modules = {}
+            for module_name, names in sorted(self.module_models.items()):
+                for name in names:
+                    self._model_modules.setdefault(name, []).append(module_name)
+        return self._model_modules.get(model_name, [])
+
+    @property
+    def graph(self):
+        ''' Module dependency graph, built on first use.
+
+            :rtype: DependencyGraph
+        '''
+        if self._graph is None:
+            self._graph = DependencyGraph({name: module.depends for name, module in self.modules.items()})
+        return self._graph
+
+    def depends_of(self, module_name):
+        ''' Direct dependencies of a module, unknown ones are ignored.
+
+            :rtype: list
+        '''
+        return [self.modules[name] for name in self.graph.depends(module_name)]
+
+    def dependents_of(self, module_name):
+        ''' Modules depending directly on a module.
+
+            :rtype: list
+        '''
+        return [self.modules[name] for name in self.graph.dependents(module_name)]
+
+    def one2many_inverse(self, comodel, model, inverse_name):
+        ''' Return the one2many field of comodel inverse of a many2one of model.
+
+            :rtype: FieldInfo
+        '''
+        if self._one2many is None:
+            self._one2many = {}
+            for info in self.models.values():
+                for field in info.fields:
+                    if field.ttype == 'one2many':
+                        self._one2many.setdefault((field.model, field.relation, field.inverse_name), field)
+        return self._one2many.get((comodel, model, inverse_name))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from snapshot import FieldInfo, MetadataSnapshot, MethodInfo, ModelInfo, ModuleInfo
+
+
+def snapshot():
+    modules = {
+        'base': ModuleInfo(name='base', state='installed', depends=[]),
+        'sale': ModuleInfo(name='sale', state='installed', depends=['base', 'missing']),
+        'sale_stock': ModuleInfo(name='sale_stock', state='uninstalled', depends=['sale']),
+    }
+    models = {
+        'res.partner': ModelInfo(model='res.partner', fields=[
+            FieldInfo(name='sale_ids', model='res.partner', ttype='one2many',
+                      relation='sale.order', inverse_name='partner_id'),
+        ], methods={}),
+        'sale.order': ModelInfo(model='sale.order', fields=[
+            FieldInfo(name='partner_id', model='sale.order', ttype='many2one', relation='res.partner'),
+        ], methods={
+            'action_confirm': MethodInfo(name='action_confirm', params='self', api='multi', module='sale'),
+        }),
+    }
+    module_models = {'base': ['res.partner'], 'sale': ['res.partner', 'sale.order', 'sale.gone']}
+    return MetadataSnapshot(
+        modules, models, module_models, {'model': ['write'], 'transient': [], 'abstract': []}, signature='s1'
+    )
+
+
+class TestMetadataSnapshot(unittest.TestCase):
+    def test_defaults(self):
+        field = FieldInfo(name='name')
+        self.assertIsNone(field.relation)
+        with self.assertRaises(AttributeError):
+            field.other = True
+
+    def test_models_of(self):
+        self.assertEqual([model.model for model in snapshot().models_of('sale')], ['res.partner', 'sale.order'])
+        self.assertEqual(snapshot().models_of('sale_stock'), [])
+
+    def test_model_modules(self):
+        self.assertEqual(snapshot().model_modules('res.partner'), ['base', 'sale'])
+        self.assertEqual(snapshot().model_modules('missing'), [])
+
+    def test_depends(self):
+        meta = snapshot()
+        self.assertEqual([module.name for module in meta.depends_of('sale')], ['base'])
+        self.assertEqual([module.name for module in meta.dependents_of('sale')], ['sale_stock'])
+        self.assertEqual(meta.depends_of('missing'), [])
+
+    def test_one2many_inverse(self):
+        meta = snapshot()
+        self.assertEqual(meta.one2many_inverse('res.partner', 'sale.order', 'partner_id').name, 'sale_ids')
+        self.assertIsNone(meta.one2many_inverse('res.partner', 'sale.order', 'user_id'))
+
+
+class TestSnapshotFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'snapshot', 's1.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        snapshot().dump(self.file_path)
+        meta = MetadataSnapshot.load(self.file_path, 's1')
+        self.assertEqual(meta.signature, 's1')
+        self.assertEqual(meta.modules['sale'].depends, ['base', 'missing'])
+        self.assertEqual(meta.models['sale.order'].fields[0].relation, 'res.partner')
+        self.assertEqual(meta.models['sale.order'].methods['action_confirm'].api, 'multi')
+        self.assertEqual(meta.base_methods['model'], ['write'])
+        self.assertEqual(os.listdir(os.path.dirname(self.file_path)), ['s1.json'])
+
+    def test_stale(self):
+        snapshot().dump(self.file_path)
+        self.assertIsNone(MetadataSnapshot.load(self.file_path, 's2'))
+        self.assertIsNone(MetadataSnapshot.load(os.path.join(self.directory, 'missing.json')))
+
+    def test_corrupted(self):
+        os.makedirs(os.path.dirname(self.file_path))
+        with open(self.file_path, 'w') as f_out:
+            f_out.write('{"format": 1, "signature": "s1"')
+        self.assertIsNone(MetadataSnapshot.load(self.file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
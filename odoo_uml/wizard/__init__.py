@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import puml_export_wizard
+from . import puml_options_wizard
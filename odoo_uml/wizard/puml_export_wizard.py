@@ -0,0 +1,199 @@
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+
+import logging
+import os
+import zipfile
+from base64 import b64decode, b64encode
+from tempfile import SpooledTemporaryFile
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+try:
+    from odoo.addons.odoo_uml.utils.render import RenderError
+except ImportError:
+    from ..utils.render import RenderError
+
+_logger = logging.getLogger(__name__)
+
+#: Number of modules whose diagrams are rendered and stored in one transaction.
+PUML_EXPORT_BATCH = 20
+
+
+class PumlExportWizard(models.TransientModel):
+    _name = 'puml.export.wizard'
+    _description = 'Export UML diagrams of modules'
+
+    def _default_module_ids(self):
+        if self.env.context.get('active_model') == 'ir.module.module':
+            return [(6, 0, self.env.context.get('active_ids', []))]
+        return []
+
+    def _default_processes(self):
+        ''' ``odoo_uml.export_processes`` parameter clamped to 1..CPU count,
+            the CPU count when it is not set or not an integer.
+        '''
+        cpus = os.cpu_count() or 1
+        processes = self.env['ir.config_parameter'].sudo().get_param('odoo_uml.export_processes')
+        try:
+            return max(1, min(int(processes), cpus))
+        except (TypeError, ValueError):
+            if processes:
+                _logger.warning('Ignore invalid odoo_uml.export_processes parameter: %s', processes)
+            return cpus
+
+    module_ids = fields.Many2many(
+        'ir.module.module',
+        string=u'Modules',
+        default=_default_module_ids
+    )
+
+    export_dependency = fields.Boolean(
+        string=u'Dependency diagram',
+        default=True
+    )
+
+    export_inv_dependency = fields.Boolean(
+        string=u'Inverse dependency diagram',
+        default=True
+    )
+
+    export_class = fields.Boolean(
+        string=u'Class diagram',
+        default=True
+    )
+
+    processes = fields.Integer(
+        string=u'Renderer processes',
+        help='Number of diagrams rendered in parallel.',
+        default=_default_processes
+    )
+
+    data = fields.Binary(
+        string=u'File',
+        readonly=True,
+        attachment=True
+    )
+
+    filename = fields.Char(
+        string=u'File name',
+        readonly=True
+    )
+
+    state = fields.Selection(
+        [('draft', 'Draft'), ('queued', 'Exporting'), ('done', 'Done'), ('failed', 'Failed')],
+        default='draft'
+    )
+
+    @api.constrains('processes')
+    def _check_processes(self):
+        cpus = os.cpu_count() or 1
+        for wizard in self:
+            if not 1 <= wizard.processes <= cpus:
+                raise ValidationError(_('Renderer processes must be between 1 and %s.') % cpus)
+
+    def _export_kinds(self):
+        return [
+            kind for kind, export in [
+                ('dependency', self.export_dependency),
+                ('inv_dependency', self.export_inv_dependency),
+                ('class', self.export_class),
+            ] if export
+        ]
+
+    def _render_modules(self, modules, kinds):
+        ''' Return diagrams of modules through the same render path as module
+            forms: stored diagrams, render cache, then configured backends.
+            When a batch can not be rendered its modules are rendered one by
+            one, so an error only misses the diagrams of its own module.
+
+            :return: (module, diagrams by kind or RenderError) pairs.
+            :rtype: list
+        '''
+        try:
+            rendered = modules._puml_render(kinds, processes=self.processes)
+            return [(module, rendered[module.id]) for module in modules]
+        except RenderError as error:
+            if len(modules) == 1:
+                _logger.warning('Unable to render diagrams of module %s: %s', modules.name, error)
+                return [(modules, error)]
+        result = []
+        for module in modules:
+            result.extend(self._render_modules(module, kinds))
+        return result
+
+    def _export(self):
+        ''' Render diagrams of selected modules by batches and write them into
+            a zip file. Rendered diagrams are stored and committed after each
+            batch, an interrupted export does not render them again.
+        '''
+        self.ensure_one()
+        kinds = self._export_kinds()
+        modules = self.module_ids
+        with SpooledTemporaryFile(max_size=16 * 1024 * 1024) as f_out:
+            with zipfile.ZipFile(f_out, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for index in range(0, len(modules), PUML_EXPORT_BATCH):
+                    for module, diagrams in self._render_modules(modules[index:index + PUML_EXPORT_BATCH], kinds):
+                        for kind in kinds:
+                            name = '{0}/{1}'.format(module.name, kind)
+                            if isinstance(diagrams, RenderError):
+                                archive.writestr('%s.error.txt' % name, str(diagrams))
+                                continue
+                            archive.writestr('%s.puml' % name, diagrams[kind]['puml'] or '')
+                            if diagrams[kind].get('dot'):
+                                archive.writestr('%s.dot' % name, diagrams[kind]['dot'])
+                            archive.writestr('%s.png' % name, b64decode(diagrams[kind]['png'] or b''))
+                    self.env.cr.commit()
+            f_out.seek(0)
+            data = b64encode(f_out.read())
+
+        self.write({
+            'data': data,
+            'filename': 'odoo_uml_diagrams.zip',
+            'state': 'done',
+        })
+
+    @api.model
+    def _cron_puml_export(self):
+        ''' Run queued exports.
+        '''
+        for wizard in self.search([('state', '=', 'queued')]):
+            try:
+                wizard._export()
+            except Exception:
+                _logger.exception('Unable to export UML diagrams.')
+                self.env.cr.rollback()
+                self.invalidate_cache()
+                wizard.write({'state': 'failed'})
+            self.env.cr.commit()
+        return True
+
+    def _action_reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Export UML Diagrams'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.multi
+    def action_export(self):
+        ''' Queue export of selected modules, it runs in background from the
+            *Odoo UML: Export diagrams* scheduled action so a large selection
+            never hits the request time limit.
+        '''
+        self.ensure_one()
+        self.write({'state': 'queued'})
+        return self._action_reopen()
+
+    @api.multi
+    def action_refresh(self):
+        ''' Show export state again, the zip file once it is done.
+        '''
+        self.ensure_one()
+        return self._action_reopen()
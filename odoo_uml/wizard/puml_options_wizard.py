@@ -0,0 +1,67 @@
+###############################################################################
+#    License, author and contributors information in:                         #
+#    __manifest__.py file at the root folder of this module.                  #
+###############################################################################
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+
+class PumlOptionsWizard(models.TransientModel):
+    ''' Set diagram options of a module, the module form is read only.
+    '''
+    _name = 'puml.options.wizard'
+    _description = 'Set UML diagram options of a module'
+
+    def _default_module_id(self):
+        if self.env.context.get('active_model') == 'ir.module.module':
+            return self.env.context.get('active_id')
+        return False
+
+    module_id = fields.Many2one(
+        'ir.module.module',
+        string=u'Module',
+        required=True,
+        readonly=True,
+        ondelete='cascade',
+        default=_default_module_id
+    )
+
+    dependency_depth = fields.Integer(
+        string=u'Dependency diagram depth',
+        help='Draw dependencies up to this number of hops, farther ones are '
+             'collapsed. 0 draws all of them.'
+    )
+
+    inv_dependency_depth = fields.Integer(
+        string=u'Inverse dependency diagram depth',
+        help='Draw modules depending on this one up to this number of hops, '
+             'farther ones are collapsed. 0 draws all of them.'
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        values = super(PumlOptionsWizard, self).default_get(fields_list)
+        module = self.env['ir.module.module'].browse(values.get('module_id'))
+        if module:
+            values.setdefault('dependency_depth', module.puml_dependency_depth)
+            values.setdefault('inv_dependency_depth', module.puml_inv_dependency_depth)
+        return values
+
+    @api.constrains('dependency_depth', 'inv_dependency_depth')
+    def _check_depth(self):
+        for wizard in self:
+            if wizard.dependency_depth < 0 or wizard.inv_dependency_depth < 0:
+                raise ValidationError(_('Diagram depths can not be negative, 0 draws every module.'))
+
+    @api.multi
+    def action_apply(self):
+        ''' Write options on the module, its diagrams are queued for rendering
+            as their signature changed.
+        '''
+        self.ensure_one()
+        self.module_id.write({
+            'puml_dependency_depth': self.dependency_depth,
+            'puml_inv_dependency_depth': self.inv_dependency_depth,
+        })
+        return {'type': 'ir.actions.act_window_close'}